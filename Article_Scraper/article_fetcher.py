@@ -0,0 +1,193 @@
+# NAME: article_fetcher.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Downloads article pages concurrently for both the google and bing searches. An asyncio event loop runs
+#              in a background thread with one aiohttp session, so connections to the same publisher are pooled and kept
+#              alive across queries, responses are compressed, and the timeout covers the whole transfer instead of
+#              each socket read. The rest of the scraper stays synchronous, it hands over a list of links and gets the
+#              pages back in the same order while the next ones are already downloading. With an HttpCache, pages
+#              stored by earlier downloads are read from disk or revalidated with a conditional request.
+#
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+import aiohttp # pip3 install aiohttp
+
+from health import CircuitOpenError
+from url_utils import domain_of
+
+
+class FetchResult:
+
+    def __init__(self, url, status = None, text = None, final_url = None, headers = None, error = None):
+        self.url = url # link that was asked for
+        self.status = status # http status code, None if no response came back
+        self.text = text # decoded body
+        self.final_url = final_url or url # link after redirects
+        self.headers = headers or {}
+        self.error = error # exception that stopped the download, None if there was a response
+
+    # true if there is a page that can be read (a response with a status below 400)
+    @property
+    def ok(self):
+        return self.error is None and self.status is not None and self.status < 400
+
+    # raise the error that stopped the download, same as requests.get would have
+    def raise_for_error(self):
+        if self.error is not None:
+            raise self.error
+
+
+# seconds from a Retry-After header, None if there isn't one (or it is an http date)
+def retry_after(headers):
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class ArticleFetcher:
+
+    # concurrency - max downloads running at once over all hosts
+    # per_host - max open connections to a single host
+    # timeout - seconds allowed for a whole download (connect, headers and body)
+    # rate_limiter - DomainRateLimiter every download waits on before it starts, None for no limit
+    # health - HealthTracker that gets every outcome, publishers with an open breaker are skipped, None to not track
+    # cache - HttpCache of pages downloaded before, None to always download
+    # metrics - RunMetrics every download is timed in (as article_fetch), None to not time them
+    def __init__(self, concurrency = 16, per_host = 4, timeout = 20, user_agent = None, rate_limiter = None, health = None,
+                 cache = None, metrics = None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.health = health
+        self.cache = cache
+        self.metrics = metrics
+        self.headers = {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Encoding": "gzip, deflate",
+            }
+        if user_agent:
+            self.headers["User-Agent"] = user_agent
+
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+
+    # starts the event loop thread and the shared session the first time they are needed
+    def _start(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target = self._loop.run_forever, name = 'article-fetcher', daemon = True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._open_session(), self._loop).result()
+
+    async def _open_session(self):
+        connector = aiohttp.TCPConnector(limit = self.concurrency, limit_per_host = self.per_host,
+                                         keepalive_timeout = 30, ttl_dns_cache = 300)
+        self._session = aiohttp.ClientSession(connector = connector, headers = self.headers,
+                                              timeout = aiohttp.ClientTimeout(total = self.timeout))
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    # download one page and time it, never raises, errors are put on the result
+    async def _fetch(self, url):
+        if self.metrics is None:
+            return await self._download(url)
+        start = time.perf_counter()
+        result = await self._download(url)
+        self.metrics.record('article_fetch', time.perf_counter() - start, error = not result.ok)
+        return result
+
+    async def _download(self, url):
+        # a page stored a little while ago is read from disk, an older one is only downloaded if it changed
+        entry, cached, revalidated = None, None, False
+        if self.cache is not None:
+            entry, cached = await asyncio.to_thread(self.cache.lookup, url)
+            if entry is not None and self.cache.is_fresh(entry):
+                await asyncio.to_thread(self.cache.used, entry)
+                return FetchResult(url, 200, cached, entry['final_url'], {'Content-Type': entry['content_type'] or ''})
+
+        # don't spend a timeout on a publisher that has been failing, answer right away
+        if self.health is not None and not self.health.allow(url):
+            return FetchResult(url, error = CircuitOpenError(domain_of(url) + ' keeps failing, not downloading from it for now'))
+
+        # wait for the host's rate limit before taking a download slot, so a throttled host doesn't hold up the others
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(url)
+
+        async with self._semaphore:
+            try:
+                headers = self.cache.conditional_headers(entry) if entry is not None else None
+                async with self._session.get(url, headers = headers) as response:
+                    if response.status == 304 and entry is not None:
+                        revalidated = True
+                        result = FetchResult(url, 200, cached, entry['final_url'], dict(response.headers))
+                    else:
+                        text = await response.text(errors = 'replace')
+                        result = FetchResult(url, response.status, text, str(response.url), dict(response.headers))
+            except Exception as e:
+                if self.health is not None:
+                    self.health.record_failure(url)
+                return FetchResult(url, error = e)
+
+        if self.health is not None:
+            self.health.record_response(url, result.status, result.final_url, retry_after(result.headers))
+
+        if self.cache is not None:
+            if revalidated:
+                await asyncio.to_thread(self.cache.used, entry, True, result.headers)
+            elif result.status == 200:
+                await asyncio.to_thread(self.cache.store, url, result.text, result.final_url, result.headers)
+        return result
+
+    # schedule a download on the event loop, returns a concurrent.futures.Future
+    def submit(self, url):
+        self._start()
+        return asyncio.run_coroutine_threadsafe(self._fetch(url), self._loop)
+
+    # yields a FetchResult for every url, in the same order as urls.
+    # at most `window` downloads are queued ahead of the one being read, so memory stays bounded on big queries
+    def fetch_iter(self, urls, window = None):
+        window = window or self.concurrency * 2
+        pending = deque()
+        urls = iter(urls)
+
+        for url in urls:
+            pending.append(self.submit(url))
+            if len(pending) >= window:
+                break
+
+        while pending:
+            result = pending.popleft().result()
+            for url in urls:
+                pending.append(self.submit(url))
+                break
+            yield result
+
+    # downloads every url and returns the results as a list in the same order
+    def fetch_many(self, urls):
+        return list(self.fetch_iter(urls))
+
+    # close the session and stop the event loop, safe to call more than once
+    def close(self):
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(timeout = 10)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout = 10)
+        self._loop = None
+        self._session = None
@@ -36,35 +36,52 @@
 
 ###### Google news and general imports
 from gnews import GNews # pip3 install gnews, pip3 install newspaper3k, pip3 install lxml[html_clean]
-import time
-import random
 import os
+import time
+import atexit
+import argparse
 from newspaper import Config
 from datetime import date, datetime, timedelta
 from dateutil.relativedelta import relativedelta
-from bs4 import BeautifulSoup # pip3 install beautifulsoup4
-import requests # pip3 install requests
-from difflib import SequenceMatcher
-from htmldate import find_date #pip3 install htmldate, pip3 install charset_normalizer==2.0.0
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from collections import deque
 from fake_useragent import UserAgent # pip3 install fake_useragent
 
 ####### openai import
 from openai import OpenAI # pip3 install openai
 
 ####### progress bar
-from tqdm import tqdm, trange
-
-####### bing search imports (selenium)
-from selenium import webdriver # pip3 install selenium
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from tqdm import tqdm
+
+####### browser and download imports
+from driver_pool import DriverPool
+from url_resolver import GoogleNewsResolver, is_google_news
+from bing_search import BingNewsSearch
+from cache_store import SqliteCache
+from article_fetcher import ArticleFetcher
+from http_cache import HttpCache
+from extraction import parse_google_page, parse_bing_page
+from rate_limiter import DomainRateLimiter
+from health import HealthTracker, is_throttling_error
+from near_dup import NearDuplicateIndex, shingles
+from text_sketch import TextSketch, found_terms
+from term_matcher import TermMatcher, normalize_term
+from url_utils import canonicalize_url
+from seen_store import SeenStore
+from llm_classifier import ArticleClassifier
+from source_cache import SourceCache, load_overrides
+import openai_batch
+from run_journal import RunJournal
+from search_cache import SearchCache
+from watermarks import QueryWatermarks, date_part, published_since
+from query_plan import QueryPlan
+from metrics import RunMetrics
 
 ####### gspread imports (api to access google sheets)
-import gspread # pip3 install gspread
-from oauth2client.service_account import ServiceAccountCredentials # pip3 install oauth2client
-from gspread.utils import ValidationConditionType
+from sheet_access import open_spreadsheet, worksheets_by_title, SheetSnapshot, SHEETS_API # pip3 install gspread, pip3 install oauth2client
+from sheet_writer import SheetWriteBuffer
 
 ############################################################################### USER INPUTS ################################################################################################
 #------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
@@ -82,9 +99,319 @@ ai = OpenAI(api_key = "")
 #------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
 ############################################################################## DEFINED FUNCTIONS ###########################################################################################
 
-# similarity matcher, returns percentage of similarity between two given strings
-def similar(a, b):
-    return SequenceMatcher(None, a, b).ratio()
+# checks a link against the articles found so far, before it is downloaded. links are compared by their canonical form
+# if the person already has the article it is a duplicate (a google entry found again on bing becomes "Google,Bing"),
+# if another person has it the query is added to their entry, if an earlier run wrote it seen_articles_mode decides.
+# returns true if the link was handled and doesn't need fetching
+def known_article(link, query, source):
+    key = canonicalize_url(link)
+
+    if key in person_index:
+        if source == "Bing":
+            for entry in person_index[key]:
+                if(entry[2].strip() == "Google"):
+                    entry[2] = "Google,Bing"
+        tqdm.write('----DUPLICATE')
+        tqdm.write(link + '\n')
+        return True
+
+    if key in data_index:
+        tqdm.write("-----Match with another person's article-----")
+        for item in data_index[key]:
+            if(query not in item[3]):
+                item[3] += "," + query
+        return True
+
+    # articles written in an earlier run are skipped, or written again from the store if a new search term found them
+    if seen_articles_mode != 'off':
+        record = seen.get(link)
+        if record is not None:
+            if seen_articles_mode == 'new_terms' and query not in record['search_terms']:
+                tqdm.write('----Adding to SHEET... (found in an earlier run, new search term)')
+                tqdm.write(record['title'] + '\n' + link + '\n')
+                add_to_person(seen.entry(record, query))
+            else:
+                tqdm.write('----ALREADY WRITTEN IN AN EARLIER RUN')
+                tqdm.write(link + '\n')
+            return True
+
+    return False
+
+
+# adds an article to the person's data and to the indexes that find duplicates.
+# signed is what similar_articles computed for the article's text, so the text isn't shingled and signed again
+def add_to_person(entry, signed = None):
+    person_index.setdefault(canonicalize_url(entry[0]), []).append(entry)
+    if signed is not None:
+        text_index.add(len(person_data), **signed)
+    elif isinstance(entry[6], TextSketch):
+        text_index.add(len(person_data), signature = entry[6].signature)
+    elif entry[6] != "NONE":
+        text_index.add(len(person_data), entry[6])
+    person_data.append(entry)
+
+
+# (position in person_data, similarity) of the person's articles whose text is nearly the same as text,
+# which is the article's full text or its TextSketch in low memory mode.
+# also returns the text's signature (and shingles for the exact check) for add_to_person
+def similar_articles(text):
+    with metrics.time('dedup'):
+        if isinstance(text, TextSketch):
+            signed = {'signature': text.signature}
+        else:
+            hashes = shingles(text, text_index.shingle_size)
+            signed = {'signature': text_index.signature(hashes = hashes), 'hashes': hashes}
+        return text_index.query(**signed), signed
+
+
+# the terms of a query that have to be in an article it found ('"Jane Doe" "EPA"' gives ['Jane Doe', 'EPA'])
+def query_terms(query):
+    terms = query.split('" "')
+    for i in range(len(terms)):
+        terms[i] = terms[i].replace('" ', '').replace('"', '')
+    return terms
+
+
+# every search term of a person's queries compiled once, each article is checked for all of them in one pass
+def person_matcher(person):
+    return TermMatcher(term for query in person for term in query_terms(query))
+
+
+# links of a search that still have to be downloaded: drops the ones known_article handled
+# and repeats of the same article within the search
+def links_to_fetch(links, query, source):
+    new_links = []
+    keys = set()
+    for link in links:
+        key = canonicalize_url(link)
+        if key in keys:
+            tqdm.write('----DUPLICATE')
+            tqdm.write(link + '\n')
+        elif not known_article(link, query, source):
+            keys.add(key)
+            new_links.append(link)
+    return new_links
+
+
+# downloads the links of a search concurrently and keeps parse(link, page) in pages by link. links another person
+# or an earlier run already has never need their page, and links the person already downloaded aren't downloaded again.
+# returns the links that were downloaded
+def fetch_pages(links, pages, parse):
+    new_links = []
+    for link in links:
+        if link in pages:
+            continue
+        if canonicalize_url(link) in data_index or (seen_articles_mode != 'off' and link in seen):
+            continue
+        pages[link] = None
+        new_links.append(link)
+
+    # the fetcher gives the pages back in the same order as new_links
+    for link, page in zip(new_links, fetcher.fetch_iter(new_links)):
+        pages[link] = parse(link, page)
+    return new_links
+
+
+# a new GNews searching from start to today (no date range if start is None) and its date window, which is part of the
+# key google searches are cached under. gnews keeps the date range on the instance and rewrites it while it pages
+# through more than 100 results, so the person workers can't share one instance
+def google_news_from(start):
+    if start is None:
+        return GNews(max_results= max_results), [None, None]
+    return GNews(max_results= max_results, end_date= (int(end_date[0]), int(end_date[1]), int(end_date[2])), start_date = (start.year, start.month, start.day)), [str(start), today]
+
+
+# the GNews instance and date window to search a query with, and the first day whose articles are new. gnews drops the
+# date range of a search for more than 100 results, so the search always covers the whole date range (and is cached
+# under the same key every run) and in incremental mode only the articles published since a little before the query's
+# last successful google search are kept. None keeps all of them, like for queries never searched
+def google_search_for(query):
+    google_search, window = google_news_from(search_start)
+    if not incremental:
+        return google_search, window, None
+    since = watermarks.since(query, 'Google News', search_start, incremental_overlap_days)
+    if since == search_start:
+        since = None
+    return google_search, window, since
+
+
+# bing's news intervals, (days, interval): past week, past month. bing's past 24 hours ("7") is never used, with the
+# overlap an incremental search always has to cover more than a day
+BING_INTERVALS = ((7, "8"), (30, "9"))
+
+# the bing interval to search a query with, narrowed like google_search_for in incremental mode but never wider than bing_date
+def bing_interval_for(query):
+    if not incremental:
+        return bing_date
+    searched = watermarks.last_searched(query, 'Bing News')
+    if searched is None:
+        return bing_date
+    days = (date.today() - searched).days + incremental_overlap_days
+    for limit, interval in BING_INTERVALS:
+        if days <= limit and (bing_date is None or interval < bing_date):
+            return interval
+    return bing_date
+
+
+# searches google news and bing news for a query: the resolved links google found, the (link, title) of every bing card and
+# whether each source could be searched. the query plan makes sure every distinct query is only searched once per run
+def search_sources(query):
+    search = {}
+
+    #################################################### Searching Google ################################################################
+
+    # getting the articles from a recent run of the same search, or from google news unless it keeps failing and its breaker is open
+    google_search, window, since = google_search_for(query)
+    news_articles = search_cache.get('Google News', query, window, max_results)
+    google_cached = news_articles is not None
+    search['google_searched'] = google_cached or health.allow('Google News')
+    search['google_error'] = None
+    if not google_cached:
+        news_articles = []
+        if search['google_searched']:
+            rate_limiter.acquire('news.google.com')
+            try:
+                with metrics.time('google_search'):
+                    news_articles = google_search.get_news(query)
+            except Exception as e:
+                # a 429 or a network error counts against google's breaker, the query goes on with what bing finds
+                search['google_error'] = str(e)
+                health.record_failure('Google News', throttled = is_throttling_error(e))
+
+    # base64 decoding method for google links is too unreliable
+    # the resolver asks google's batchexecute endpoint for the real link and remembers it between runs,
+    # the selenium method of clicking through the link and waiting for the redirect is only used if that fails
+    # a link that is still a google news link afterwards couldn't be resolved
+    resolve = metrics.timed('link_resolution', resolver.resolve, failed = is_google_news)
+    search['google_urls'] = [resolve(article['url']) for article in published_since(news_articles, since)]
+
+    #################################################### Searching Bing ################################################################
+
+    query_bing = query.replace(" ","+")
+    query_bing = query_bing.replace("&", "%26")
+    query_bing = query_bing.replace(",", "%2C")
+    query_bing = query_bing.lower()
+
+    # building url 
+    interval = bing_interval_for(query)
+    if(interval == None):
+        url = 'https://www.bing.com/news/search?q=' + query_bing + '&qft=sortbydate%3d"1"&form=PTFTNR'
+    else:
+        url = 'https://www.bing.com/news/search?q=' + query_bing + '&qft=sortbydate%3d"1"+interval%3d"' + interval + '"&form=PTFTNR'
+
+    # searching bing over http (chrome only for a page bing sends without its news layout), unless bing keeps failing and its breaker is open
+    cards = [] # (link, title) of every news card found
+    search['bing_allowed'] = health.allow('Bing News')
+    search['bing_blocked'] = False
+    search['bing_error'] = None
+    if search['bing_allowed']:
+        try:
+            with metrics.time('bing_search') as timer:
+                cards, search['bing_blocked'] = bing.search(url)
+                if search['bing_blocked']:
+                    timer.fail()
+        except Exception as e:
+            # bing answering with an error or chrome not starting counts against bing's breaker like a captcha does
+            search['bing_error'] = str(e)
+            health.record_failure('Bing News', throttled = is_throttling_error(e))
+        if search['bing_blocked']:
+            health.record_failure('Bing News', throttled = True)
+    bing_searched = search['bing_allowed'] and not search['bing_blocked'] and search['bing_error'] is None
+    search['cards'] = cards
+
+    # an empty search is normal for a lot of queries, so it only counts as a failure for a search source
+    # when the other source found articles for the same query. only a search that worked is cached and
+    # moves the query's watermark (google_ok, bing_ok)
+    search['google_ok'] = google_cached
+    if search['google_searched'] and not google_cached and search['google_error'] is None:
+        if len(news_articles) == 0 and bing_searched and len(cards) > 0:
+            health.record_failure('Google News')
+        else:
+            health.record_success('Google News')
+            search['google_ok'] = True
+            search_cache.set('Google News', query, news_articles, window, max_results)
+    search['bing_ok'] = False
+    if bing_searched:
+        if len(cards) == 0 and search['google_searched'] and search['google_error'] is None and len(news_articles) > 0:
+            health.record_failure('Bing News')
+        else:
+            health.record_success('Bing News')
+            search['bing_ok'] = True
+
+    return search
+
+
+# parse(link, page) in low memory mode: the text of the parsed page is replaced by its TextSketch right away,
+# keeping only its minhash signature, which of the person's search terms (compiled in matcher) it has and a short snippet
+def sketch_page(parse, matcher, link, page):
+    parsed = parse(link, page)
+    if parsed is None:
+        return None
+    if isinstance(parsed, tuple):
+        return (TextSketch.of(parsed[0], matcher, text_signer, low_memory_snippet),) + parsed[1:]
+    parsed.text = TextSketch.of(parsed.text, matcher, text_signer, low_memory_snippet)
+    return parsed
+
+
+# everything a person's searches need from the network: the search results of every query and the parsed pages of the
+# articles they found. nothing is decided or added to data here, so several people can be gathered at the same time.
+# position - where the person is in the run, for the journal
+# searches - queries of the person that were already gathered (from the journal), only the queries after them are searched
+def gather_person(position, person, searches = None):
+    searches = list(searches or [])
+    parse_google = partial(parse_google_page, config = config)
+    parse_bing = parse_bing_page
+    if low_memory:
+        matcher = person_matcher(person)
+        parse_google = partial(sketch_page, parse_google, matcher)
+        parse_bing = partial(sketch_page, parse_bing, matcher)
+    parse_google = metrics.timed('extraction', parse_google, failed = lambda parsed: parsed is None)
+    parse_bing = metrics.timed('extraction', parse_bing, failed = lambda parsed: parsed is None)
+    if len(searches) > 0:
+        pages = {'Google': searches[0]['google_pages'], 'Bing': searches[0]['bing_pages']}
+    else:
+        pages = {'Google': {}, 'Bing': {}} # link -> parsed page, shared by all the person's queries
+
+    for query in person[len(searches):]:
+        search = {'query': query, 'google_pages': pages['Google'], 'bing_pages': pages['Bing']}
+
+        # queries that search the same terms as one searched before in the run get its results
+        search.update(query_plan.run(query, search_sources))
+
+        google_links = fetch_pages(search['google_urls'], pages['Google'], parse_google)
+        bing_links = fetch_pages([card[0] for card in search['cards']], pages['Bing'], parse_bing)
+
+        journal.add_search(position, search, google_links, bing_links)
+        searches.append(search)
+
+    journal.person_gathered(position)
+    return searches
+
+
+# gathers the people in order, up to person_workers at a time, and yields (person, function that returns what was gathered
+# or raises what went wrong). the next people are gathered while the one before them is being added to data.
+# people the journal has all the queries of are not searched again
+def gathered_people(people):
+    def gather(position, person):
+        if position in journal.gathered:
+            return journal.searches[position]
+        return gather_person(position, person, journal.searches.get(position))
+
+    if person_workers <= 1:
+        for position, person in enumerate(people):
+            yield person, lambda position = position, person = person: gather(position, person)
+        return
+
+    with ThreadPoolExecutor(max_workers = person_workers) as pool:
+        pending = deque()
+        for position, person in enumerate(people):
+            pending.append((person, pool.submit(gather, position, person)))
+            if len(pending) > person_workers:
+                person, future = pending.popleft()
+                yield person, future.result
+        while len(pending) > 0:
+            person, future = pending.popleft()
+            yield person, future.result
 
 
 # function that formats and organizes the prompts into a 2d array that the program can read
@@ -165,6 +492,53 @@ def compare_people(new_people,old_people):
 
     return str_diff1, str_diff2
 
+
+# writes the articles of a run below the ones on the first worksheet, between a start and an end of date row,
+# with a yes/no dropdown on every article. the articles are remembered so the next runs can skip them
+def write_articles(data, date_cutoff):
+    print("\n--------Writing Everything to SHEET...............................")
+
+    header =['URL', 'URL_Title', 'Search_Source', 'Search_Terms', 'Published Date', 'Date', 'Notes']
+
+    # open first sheet
+    sheet = list(worksheets.values())[0]
+
+    # one read of the first column tells if the headers are there and where the last row is
+    sheets_quota.acquire(SHEETS_API)
+    with metrics.time('sheet_read'):
+        first_column = sheet.col_values(1)
+
+    # check for empty headers, if not there then populate them
+    if(len(first_column) == 0 or first_column[0] == ''):
+        sheet_writes.write_rows(sheet, 1, [header])
+
+    #find the row length of the sheet
+    start_rows = max(len(first_column), 1)
+
+    # populate data array with articles
+    index = 3
+    for item in data:
+         item[4] = str(item[4])
+         index += 1
+
+    # signal beginning of data, post articles, signal end of data
+    rows = [['Start of Date ' + date_cutoff + ' to ' + str(date.today())]] + data + [['End of Date ' + date_cutoff + ' to ' + str(date.today())]]
+    sheet_writes.write_rows(sheet, start_rows + 1, rows)
+
+    # add yes or no cell to each row
+    if(len(data) > 0):
+        sheet_writes.add_validation(sheet, start_rows + 2, start_rows + 1 + len(data), 11, ['yes','no'])
+
+    # size cells to fit data
+    sheet_writes.auto_resize(sheet, 0, min(index, sheet.col_count))
+
+    # the results, the last log rows and the formatting go out in one request, retried if the quota is exceeded
+    sheet_writes.flush()
+
+    # remember every article written in this run so the next runs can skip it
+    for item in data:
+        seen.record(item)
+
 ############################################################################## PROGRAM STARTS ###########################################################################################
 
 ua = UserAgent()
@@ -176,32 +550,154 @@ prompts = [] # stores all lines in file
 
 max_results = 1000; # max results that the program will search for (bing search will match or go a little over)
 
-# initializing sheets
-scope = [
-    'https://www.googleapis.com/auth/spreadsheets',
-    'https://www.googleapis.com/auth/drive'
-    ]
+driver_pool_size = 2 # amount of headless chrome instances shared by the google redirects and bing searches
+driver_max_pages = 50 # a chrome instance is restarted after it has been used this many times
+
+url_cache_file = os.path.dirname(os.path.abspath(__file__)) + '/scraper_cache.db' # stores google news links already resolved to the publisher's url
+
+incremental_search = False # only search what is new since each query's last run (same as running with --incremental), new queries get the whole date range
+incremental_overlap_days = 2 # days before a query's last search that an incremental search still covers, news shows up in searches late
+
+search_cache_hours = 12 # hours a google news search is reused by later runs with the same query and date range, 0 to always search
+
+# people searched at the same time. their searches and downloads run in parallel, the articles are still added to
+# the sheet one person at a time in the order of the Prompts worksheet, so the results are the same as searching one by one
+person_workers = 1
+
+fetch_concurrency = 16 # max article downloads running at once
+fetch_per_host = 4 # max open connections to one publisher
+fetch_timeout = 20 # seconds allowed for one whole article download
+
+# downloaded article pages are kept on disk in the http_cache folder, a page stored less than http_cache_fresh_hours ago
+# is read from disk, an older one is only downloaded again if the publisher says it changed
+http_cache_mb = 500 # megabytes the stored pages may take before the least recently used are removed, 0 to turn off
+http_cache_fresh_hours = 6 # hours a stored page is used without asking the publisher, 0 to always ask
+
+# requests allowed per host as (requests per second, burst), every host gets its own limit so they don't slow each other down
+rate_limits = {
+    'news.google.com': (1, 2), # searches and link resolution
+    'bing.com': (0.5, 1), # searches and scrolling
+    }
+default_rate_limit = (1, 3) # every publisher not listed above, None to not limit publishers
+rate_limit_jitter = 1.0 # max random seconds added when a request has to wait for its host, 0 to turn off
+
+breaker_failures = 5 # failures in a row before the scraper stops sending requests to a search source or publisher
+breaker_cooldown = 300 # seconds before a failing source or publisher is tried again
+
+similarity_threshold = 0.75 # estimated text similarity at which an article gets a "Duplicate text with" note
+similarity_exact_check = False # confirm similar articles with the exact similarity of their text (slower, more memory)
+
+# keep only a sketch of every downloaded article (its minhash signature, the search terms found in it and a snippet)
+# instead of its whole text, so memory stays flat however many articles a person has (same as running with --low-memory).
+# similar articles are then always found by their estimated similarity, similarity_exact_check needs the whole text
+low_memory = False
+low_memory_snippet = 300 # characters of the article's text kept in low memory mode
+
+# articles written to the sheet in earlier runs are remembered in url_cache_file
+#   'skip' - they are left out before being downloaded, parsed or classified
+#   'new_terms' - they are only written again (from what was stored, nothing is downloaded or classified) when a new search term finds them
+#   'off' - every article is processed like it was never seen
+seen_articles_mode = 'skip'
+
+openai_model = "gpt-4o-mini"
+openai_concurrency = 8 # articles classified at the same time
+openai_requests_per_minute = 500 # rate limits of the openai account for the model, requests wait when they would go over them
+openai_tokens_per_minute = 200000
+source_cache_days = 90 # days the reach and name of a news source are remembered before openai is asked again, None for forever
+openai_batch_mode = False # classify with the OpenAI Batch API (cheaper, results can take hours), same as running with --batch
+openai_batch_wait = 3600 # seconds to wait for a batch before exiting, its results are written later with --resume-batch
+openai_batch_poll = 30 # seconds between checks of the batch status
+
+sheets_requests_per_minute = 60 # google sheets api quota, requests wait when they would go over it
+sheets_flush_every = 10 # people searched between writes of the Run_Log to the sheet, 0 to only write at the end of the run
+sheets_write_retries = 5 # times a write is tried again when the sheets quota is exceeded, waiting longer every time
+
+# the latency and errors of every stage of the last run are written to metrics_file + '.json' and + '.prom',
+# point it at the node_exporter textfile directory to have prometheus collect them
+metrics_file = os.path.dirname(os.path.abspath(__file__)) + '/run_metrics'
+
+parser = argparse.ArgumentParser(description = "Searches Google and Bing news for the people on the Prompts worksheet and writes the articles to the sheet")
+parser.add_argument('--batch', action = 'store_true', help = "classify the articles with the OpenAI Batch API, like openai_batch_mode = True")
+parser.add_argument('--incremental', action = 'store_true', help = "only search what is new since each query's last run, like incremental_search = True")
+parser.add_argument('--low-memory', action = 'store_true', help = "keep a small sketch of every article instead of its text, like low_memory = True")
+parser.add_argument('--resume', action = 'store_true', help = "continue the last run that didn't finish, from the journal it left behind")
+parser.add_argument('--resume-batch', action = 'store_true', help = "write the results of the OpenAI batch an earlier run submitted, nothing is searched")
+args = parser.parse_args()
+
+# times every stage of the run, the summary goes to the Run_Log and to metrics_file
+metrics = RunMetrics()
+
+# initializing sheets, authorizing and opening the spreadsheet only once
+sheets_quota = DomainRateLimiter(default = None, limits = {SHEETS_API: (sheets_requests_per_minute / 60, 10)})
 
 file_name = os.path.dirname(os.path.abspath(__file__)) + '/client_key.json'
 
-creds = ServiceAccountCredentials.from_json_keyfile_name(file_name,scope)
-client = gspread.authorize(creds)
-
 f = open(os.path.dirname(os.path.abspath(__file__)) + '/article_name.txt', 'r')
 article_name = f.readlines()[0].strip()
 
-sheet = client.open(article_name).worksheet('Prompts')
-Run_Log = client.open(article_name).worksheet('Run_Log')
+with metrics.time('sheet_read'):
+    spreadsheet = open_spreadsheet(file_name, article_name, quota = sheets_quota)
+    worksheets = worksheets_by_title(spreadsheet, quota = sheets_quota)
+
+# every write to the sheet is collected and sent in as few requests as possible, whatever is left is written on exit
+sheet_writes = SheetWriteBuffer(spreadsheet, quota = sheets_quota, retries = sheets_write_retries, metrics = metrics)
+journal = None
+people_done = 0
+
+# the last write also goes in the journal, so a resumed run doesn't log the people it covered a second time
+def flush_on_exit():
+    sheet_writes.flush()
+    if journal is not None:
+        journal.logged(people_done)
+atexit.register(flush_on_exit)
+
+sheet = worksheets['Prompts']
+Run_Log = worksheets['Run_Log']
+link_history_sheet = worksheets['Prompt_History'] # prompt history of the sheet, it should be named 'Prompt_History'
+
+# articles written to the sheet in earlier runs
+seen = SeenStore(url_cache_file)
+
+# reach and name of every news source seen before (or set in source_overrides.txt), only the epa region is asked for their articles
+sources = SourceCache(url_cache_file, ttl_days = source_cache_days, overrides = load_overrides())
+
+# only pick up the results of a batch an earlier run submitted
+if args.resume_batch:
+    record = openai_batch.load_job()
+    if record is None:
+        print("\n--------No OpenAI batch to resume...............................")
+        exit()
+    if record['batch_id'] is not None:
+        batch = openai_batch.wait(ai, record, poll_interval = openai_batch_poll, timeout = openai_batch_wait)
+        if batch.status not in openai_batch.FINISHED:
+            print("\n--------OpenAI batch is still running, try --resume-batch again later...............................")
+            exit()
+        openai_batch.merge(ai, batch, record, sources = sources)
+    sheet_writes.append_row(Run_Log, ['RUN METRICS', metrics.report(articles = len(record['data'])), str(date.today())])
+    write_articles(record['data'], record['date_cutoff'])
+
+    # the watermarks of the run that submitted the batch, now that its articles are on the sheet
+    batch_watermarks = QueryWatermarks(url_cache_file)
+    for query, (searched_by, newest) in record.get('query_marks', {}).items():
+        batch_watermarks.update(query, searched_by, record['searched_on'], newest)
+
+    openai_batch.finish()
+    metrics.write(metrics_file, articles = len(record['data']))
+    print("\n--------DONE...............................\n")
+    exit()
+
+# the whole prompts worksheet is read in one request, every cell below is looked up locally
+with metrics.time('sheet_read'):
+    prompts_sheet = SheetSnapshot(sheet, quota = sheets_quota)
 
-people = []
-row_values = []
-index = 7
+# the people, templates, affiliations and custom prompts are expanded into every person's queries
+expansion_start = time.perf_counter()
 
 prompts = []
 prompt = []
 
 # reading the affiliation definitions, organizing them and separate the definitions from the terms
-affiliation_definitions_sheet = sheet.cell(3,3).value
+affiliation_definitions_sheet = prompts_sheet.cell(3,3)
 
 if(affiliation_definitions_sheet != None):
     affiliation_definitions = affiliation_definitions_sheet.split('\n')
@@ -210,25 +706,18 @@ if(affiliation_definitions_sheet != None):
         affiliation_definitions[i] = affiliation_definitions[i].split(' = ')
         affiliation_definitions[i][1] = affiliation_definitions[i][1].split(', ')
 
-prompt_templates = sheet.cell(3,1).value
+prompt_templates = prompts_sheet.cell(3,1)
 
 # if there is no prompt templates, then there is nothing to run
 if(prompt_templates == None):
-    Run_Log.append_row(['PROMPT ERROR', 'NO PROMPT FORMATTING. Not running news search...', str(date.today())])
+    sheet_writes.append_row(Run_Log, ['PROMPT ERROR', 'NO PROMPT FORMATTING. Not running news search...', str(date.today())])
+    sheet_writes.flush()
     exit()
 else:
     prompt_templates = prompt_templates.split('\n')
 
-# read all the people listed in prompts on the sheet
-while True:
-    row_values = sheet.row_values(index)
-    if(row_values == []):
-        break
-    index = index + 1
-    
-    people.append(row_values)
-
-    time.sleep(1)
+# read all the people listed in prompts on the sheet, the table starts on row 7
+people = prompts_sheet.rows_from(7)
 
 new_people = []
 
@@ -260,27 +749,13 @@ for person in people:
 
 text = ''
 
-datesheet = sheet.cell(5,3).value
+datesheet = prompts_sheet.cell(5,3)
 counter = 0
 
 ############################################################################ ACCESS GOOGLE SHEETS / CHECK AND UPDATE PROMPTS ##################################################################################
-#Google sheets initialization
-#Authorize the API
-scope = [
-    'https://www.googleapis.com/auth/spreadsheets',
-    'https://www.googleapis.com/auth/drive'
-    ]
-file_name = os.path.dirname(os.path.abspath(__file__)) + '/client_key.json'
-creds = ServiceAccountCredentials.from_json_keyfile_name(file_name,scope)
-client = gspread.authorize(creds)
-
-sheet = client.open(article_name).worksheet('Prompts') # opening the prompts section of the sheet
-
-# opening the prompt history of the sheet, it should be named 'Prompt_History'
-link_history_sheet = client.open(article_name).worksheet('Prompt_History')
 
 # open custom prompts
-sheet_cust_prompts = sheet.cell(5,1).value
+sheet_cust_prompts = prompts_sheet.cell(5,1)
 
 # format the custom prompts and add them to the actual prompts array
 if(sheet_cust_prompts != None):
@@ -315,9 +790,10 @@ for prompt in prompts:
     else:
         text += "\n"
 # update new prompts array to sheet
-sheet.update_cell(1,1,text)
-# read prompts and date from sheet, organize them
-new_prompts, new_temp_date = organize_prompts(sheet.cell(1,1).value.split('\n'))
+sheet_writes.update_cell(sheet, 1, 1, text)
+# organize the prompts and date that were just written, no need to read them back from the sheet
+new_prompts, new_temp_date = organize_prompts(text.split('\n'))
+metrics.record('query_expansion', time.perf_counter() - expansion_start)
 
 # open previous prompts from text file
 with open(os.path.dirname(os.path.abspath(__file__)) + "/search_terms.txt", 'r', encoding = 'utf-8') as file:
@@ -340,8 +816,8 @@ if(len(old_people) > 2):
     if '/' in old_people[len(old_people) - 2]:
         old_temp_date = old_people[(len(old_people) - 1)]
 # find the custom prompts
-if(sheet.cell(5,1).value != None):
-    custom_prompts = sheet.cell(5,1).value.split('\n')
+if(sheet_cust_prompts != None):
+    custom_prompts = sheet_cust_prompts.split('\n')
 else:
     custom_prompts = ''
 
@@ -427,12 +903,12 @@ print(str_diff1 + '\n' + str_diff2)
 # if there are changes
 if(str_diff1.strip() != 'Added:' or str_diff2.strip() != 'Removed:'):
     # updating cell in first sheet with added and removed values
-    sheet.update_cell(1,2,str_diff1 + '\n' + str_diff2)
-    sheet.columns_auto_resize(0, 1)
+    sheet_writes.update_cell(sheet, 1, 2, str_diff1 + '\n' + str_diff2)
+    sheet_writes.auto_resize(sheet, 0, 1)
 
     # appending to the second row the changes
-    link_history_sheet.append_row([str_diff1 + '\n' + str_diff2, str(date.today())])
-    link_history_sheet.columns_auto_resize(0, 2)
+    sheet_writes.append_row(link_history_sheet, [str_diff1 + '\n' + str_diff2, str(date.today())])
+    sheet_writes.auto_resize(link_history_sheet, 0, 2)
 
     # opening the search terms file and overwriting the new prompts
     f = open(os.path.dirname(os.path.abspath(__file__)) + "/search_terms.txt", "w")
@@ -454,6 +930,9 @@ if(aff_diff2.strip() != '' or aff_diff1.strip() != ''):
     c.write('\n'.join(raw_affiliations))
     c.close()
 
+# write the new prompts and the changes to the sheet together
+sheet_writes.flush()
+
 # bing has its own date rules, initialize bing date to none (no limit)
 bing_date = None
 
@@ -517,122 +996,133 @@ config = Config()
 config.browser_user_agent = user_agent
 config.request_timeout = 10
 
-# if the user entered date in file and it is formatted correctly, if not then initialize search without date range
-if(new_temp_date != None) and res == True:
-    google_news = GNews(max_results= max_results, end_date= (int(end_date[0]), int(end_date[1]), int(end_date[2])) , start_date = (int(new_temp_date[0]), int(new_temp_date[1]), int(new_temp_date[2])))
-else:
-    google_news = GNews(max_results= max_results)
+# if the user entered date in file and it is formatted correctly the google searches start on its first day (a new GNews
+# is made for every search, see google_news_from), if not then the searches are done without date range
+search_start = date(int(new_temp_date[0]), int(new_temp_date[1]), int(new_temp_date[2])) if (new_temp_date != None) and res == True else None
+
+# last successful search of every query, in incremental mode searches only cover what is new since then
+watermarks = QueryWatermarks(url_cache_file)
+incremental = incremental_search or args.incremental
+query_marks = {} # query -> (sources that searched it, newest publish date found), saved as watermarks once the articles are written
+
+# in low memory mode the article texts are sketched as soon as they are parsed, signed the same way as text_index signs them
+low_memory = low_memory or args.low_memory
+text_signer = NearDuplicateIndex(threshold = similarity_threshold)
+
+# google searches done within search_cache_hours are reused instead of searched again
+search_cache = SearchCache(url_cache_file, ttl_hours = search_cache_hours)
 
 # initialize data and headers for csv file
 data = []
-header =['URL', 'URL_Title', 'Search_Source', 'Search_Terms', 'Published Date', 'Date', 'Notes']
+data_index = {} # canonical link -> entries in data with that link, to find other people's articles without scanning data
 
-headers = {
-            "User-Agent":
-            str(ua.chrome)
-            }
+# politeness per host, replaces the random sleeps after every search and before every article
+rate_limiter = DomainRateLimiter(default = default_rate_limit, limits = rate_limits, jitter = rate_limit_jitter)
+
+# tracks failures of the searches and every publisher, backs off hosts that throttle us and skips hosts that keep failing
+health = HealthTracker(rate_limiter = rate_limiter, source_hosts = {'Google News': 'news.google.com', 'Bing News': 'bing.com'},
+                       failure_threshold = breaker_failures, cooldown = breaker_cooldown)
+
+# headless chrome instances, reused for every google redirect and bing search instead of starting chrome for each
+driver_pool = DriverPool(size = driver_pool_size, max_pages = driver_max_pages)
+
+# downloads the articles of both searches concurrently, with pooled keep-alive connections per publisher
+http_cache = HttpCache(max_mb = http_cache_mb, fresh_hours = http_cache_fresh_hours) if http_cache_mb else None
+fetcher = ArticleFetcher(concurrency = fetch_concurrency, per_host = fetch_per_host, timeout = fetch_timeout, user_agent = user_agent,
+                         rate_limiter = rate_limiter, health = health, cache = http_cache, metrics = metrics)
+
+# pages through bing news searches over http, only falls back to scrolling them in chrome if that fails
+bing = BingNewsSearch(driver_pool = driver_pool, user_agent = user_agent, max_results = max_results, rate_limiter = rate_limiter)
+
+# turns google news links into publisher links over http, only falls back to chrome if that fails
+resolver = GoogleNewsResolver(SqliteCache('resolved_urls', path = url_cache_file), driver_pool = driver_pool, user_agent = user_agent,
+                              rate_limiter = rate_limiter, health = health)
 
 # iterate through 2d array, go through each person than interate through each query per person
 # checks for duplicates on the per person level. If the same article shows up for the prompts of
 # different people, it will show up for every person in the csv file
+# the searches and downloads of the next people run in the background (person_workers) while a person's articles are added
 # also uses tqdm to create a progress bar
-for person in tqdm(new_prompts):
+# every query, classification and Run_Log write is journaled, so a run that crashes can be continued with --resume
+journal = RunJournal()
+if args.resume and journal.load():
+    if journal.date_cutoff != date_cutoff:
+        print("\n--------The date range changed since the run that is resumed, its date range is kept...............................")
+        date_cutoff = journal.date_cutoff
+    new_prompts = journal.people
+    journal.resume()
+    print("\n--------Resuming the last run, " + str(len(journal.gathered)) + " of " + str(len(new_prompts)) + " people were already searched...............................")
+else:
+    if args.resume:
+        print("\n--------No unfinished run to resume, starting a new one...............................")
+    journal.start(new_prompts, date_cutoff)
+
+# every distinct query is searched once, people and prompts that ask for the same search share its results.
+# a resumed run starts with the results of the searches in the journal, they aren't searched again for the people after them
+query_plan = QueryPlan(new_prompts)
+for searches in journal.searches.values():
+    for search in searches:
+        query_plan.seed(search['query'], {key: value for key, value in search.items() if key not in ('query', 'google_pages', 'bing_pages')})
+print("\n--------Query plan: " + query_plan.report() + "...............................")
+
+for person, gathered in tqdm(gathered_people(new_prompts), total = len(new_prompts)):
     hit = False
     person_data = [] # reset the per person news data
+    person_terms = person_matcher(person) # finds the search terms of all the person's queries in an article
+    person_index = {} # canonical link -> entries in person_data with that link
+    # minhash index of the text of every article in person_data, keyed by position in person_data
+    text_index = NearDuplicateIndex(threshold = similarity_threshold, exact_check = similarity_exact_check)
 
     try:
 
-        for query in person:
+        for search in gathered():
+            query = search['query']
+            first_entry = len(person_data)
 
             #################################################### Searching Google ################################################################
 
-            query_split = query.split('" "')
-            
-            # formatting the queries
-            for i in range(len(query_split)):
-                query_split[i] = query_split[i].replace('" ', '').replace('"', '')
+            query_split = query_terms(query)
 
-            # getting the articles
-            news_articles = google_news.get_news(query)
             tqdm.write('\n\n******** ' + query + '********')
             tqdm.write("--------Searching Google..............................\n")
-            time.sleep(random.uniform(3,5))
-
-            for article in news_articles:
-
-                # base64 decoding method for google links is too unreliable
-                # using the selenium method of clicking through link and waiting for redirect before
-                # pulling link, python requests couldn't do it from my testing
+            if not search['google_searched']:
+                tqdm.write('----GOOGLE NEWS KEEPS FAILING, SEARCH SKIPPED\n')
+            elif search.get('google_error') is not None:
+                tqdm.write('----GOOGLE NEWS SEARCH FAILED: ' + search['google_error'] + '\n')
 
-                options = webdriver.ChromeOptions()
-                options.add_experimental_option("excludeSwitches", ['enable-logging'])
-                options.add_argument('--headless=new')
-                options.add_argument('--log-level=3')
-                options.add_argument('--no-sandbox')
-                options.set_capability("browserVersion", "117")
-                options.add_argument("--disable-dev-shm-usage")
-                driver = webdriver.Chrome(options = options)
+            # articles the person or another person already has are handled without looking at their page
+            actual_urls = links_to_fetch(search['google_urls'], query, "Google")
 
-                driver.get(article['url'])
+            # the pages were downloaded and parsed when the person was gathered
+            for actual_url in actual_urls:
 
-                time.sleep(1)
-
-                actual_url = driver.current_url
-
-                full_article = google_news.get_full_article(actual_url)  # newspaper3k instance, you can access newspaper3k all attributes in full_article
+                full_article = search['google_pages'].get(actual_url)  # newspaper3k instance, you can access newspaper3k all attributes in full_article
                     
                 try:
 
                     Notes = ''
 
-                    duplicate = False
-
-                    # check for duplicate in the person's data
-                    for j in person_data:
-                        if j[0] == full_article.url + " " and j[1] == full_article.title:
-                            duplicate = True
                     # checking for a similarity match, if there is then add match to notes
-                    if not duplicate:
-                        for item in person_data:
-                            sim = similar(full_article.text, item[6])
-                            if sim >= 0.75:
-                                tqdm.write("----TOO MUCH SIMILARITY DETECTED: " + str(round(sim * 100,2)) + "%")
-                                Notes += "Duplicate text with: " + item[0] + "\n"
-                    
-                    # if it's a duplicate, don't add it to data, if it is then do
-                    if duplicate: 
-                        tqdm.write('----DUPLICATE')
+                    matches, signed = similar_articles(full_article.text)
+                    for position, sim in matches:
+                        tqdm.write("----TOO MUCH SIMILARITY DETECTED: " + str(round(sim * 100,2)) + "%")
+                        Notes += "Duplicate text with: " + person_data[position][0] + "\n"
+
+                    # double checking for search terms in article, quotes, dashes, spacing and case don't matter
+                    found = found_terms(full_article.text, person_terms)
+                    items_found = all(normalize_term(item) in found for item in query_split)
+                    # if not found add to notes
+                    if not items_found:
+                        Notes += "Prompt not found in article\n"
+
+                    # append it to the person's articles if it is in the date range
+                    if(date_cutoff == None or full_article.publish_date == None or str(full_article.publish_date) >= date_cutoff):
+                        tqdm.write('----Adding to SHEET...')
                         tqdm.write(full_article.title + '\n' + full_article.url + '\n')
+                        add_to_person([full_article.url + " ", full_article.title, "Google", query, full_article.publish_date, today, full_article.text, Notes], signed)
                     else:
-
-                        items_found = True
-
-                        # double checking for search terms in article
-                        for item in query_split:
-                            if item.lower() not in full_article.text.lower():
-                                items_found = False
-                        # if not found add to notes
-                        if not items_found:
-                            Notes += "Prompt not found in article\n"
-                        
-                        # check for match along other categories, if there is then append the prompt to that entry
-                        outside_scope_match = False
-                        for item in data:
-                            if item[0].strip() == full_article.url.strip():
-                                tqdm.write("-----Match with another person's article-----")
-                                outside_scope_match = True
-                                if(query not in item[3]):
-                                    item[3] += "," + query
-
-                        # if there is no duplicate found, append it to the master array
-                        if not outside_scope_match:
-                            if(date_cutoff == None or full_article.publish_date == None or str(full_article.publish_date) >= date_cutoff):
-                                tqdm.write('----Adding to SHEET...')
-                                tqdm.write(full_article.title + '\n' + full_article.url + '\n')
-                                person_data.append([full_article.url + " ", full_article.title, "Google", query, full_article.publish_date, today, full_article.text, Notes])
-                            else:
-                                tqdm.write('---False Positive, Date: ' + str(full_article.publish_date) + ' outside of Specified Range........')
-                                tqdm.write(full_article.title + '\n' + full_article.url + '\n')
+                        tqdm.write('---False Positive, Date: ' + str(full_article.publish_date) + ' outside of Specified Range........')
+                        tqdm.write(full_article.title + '\n' + full_article.url + '\n')
                 # full_article is not reliable, if there is an error fetching data full_article is empty
                 # in this instance, actual_url needs to be used
                 except: 
@@ -640,295 +1130,182 @@ for person in tqdm(new_prompts):
 
                     Notes = ''
 
-                    duplicate = 0
-
-                    # check for duplicates in the person's data
-                    for j in person_data:
-                        if j[0] == actual_url + " " and j[1] == "ARTICLE TIMED OUT WHEN FETCHING DATA":
-                            duplicate = 1
-                            
-                    # if it's a duplicate, don't add it to data, if it is then do
-                    if duplicate: 
-                        tqdm.write('----DUPLICATE')
-                        tqdm.write("ARTICLE TIMED OUT WHEN FETCHING DATA" + '\n' + actual_url + '\n')
-                    else:
-                        outside_scope_match = False
-                        # checking for match in other categories, if so append query to original entry
-                        for item in data:
-                            if item[0].strip() == actual_url.strip():
-                                tqdm.write("-----Match with another person's article-----")
-                                outside_scope_match = True
-                                if(query not in item[3]):
-                                    item[3] += "," + query
-
-                        # if no duplicate, append to master list of articles
-                        if not outside_scope_match:
-                            tqdm.write('----Adding to SHEET...')
-                            tqdm.write("ARTICLE TIMED OUT WHEN FETCHING DATA" + '\n' + actual_url + '\n')
-                            Notes += "Timed Out\n"
-                            person_data.append([actual_url + " ",  "ARTICLE TIMED OUT WHEN FETCHING DATA", "Google", query, "ERROR FETCHING PUBLISHED DATE", today, "NONE", Notes])
-
-                driver.close()
+                    tqdm.write('----Adding to SHEET...')
+                    tqdm.write("ARTICLE TIMED OUT WHEN FETCHING DATA" + '\n' + actual_url + '\n')
+                    Notes += "Timed Out\n"
+                    add_to_person([actual_url + " ",  "ARTICLE TIMED OUT WHEN FETCHING DATA", "Google", query, "ERROR FETCHING PUBLISHED DATE", today, "NONE", Notes])
         
             #################################################### Searching Bing ################################################################
 
             tqdm.write("--------Searching Bing..............................\n")
 
-            headers = {
-            "User-Agent":
-            str(ua.chrome)
-            }
-
-            query_bing = query.replace(" ","+")
-            query_bing = query_bing.replace("&", "%26")
-            query_bing = query_bing.replace(",", "%2C")
-            query_bing = query_bing.lower()
-
-            # initializing chrome tab and searching the bing url
-            options = webdriver.ChromeOptions()
-            options.add_experimental_option("excludeSwitches", ['enable-logging'])
-            options.add_argument('--headless=new')
-            options.add_argument('--log-level=3')
-            options.set_capability("browserVersion", "117")
-            driver = webdriver.Chrome(options = options)
-            # building url 
-            if(bing_date == None):
-                url = 'https://www.bing.com/news/search?q=' + query_bing + '&qft=sortbydate%3d"1"&form=PTFTNR'
-            else:
-                url = 'https://www.bing.com/news/search?q=' + query_bing + '&qft=sortbydate%3d"1"+interval%3d"' + bing_date + '"&form=PTFTNR'
-
-            driver.get(url)
-            wait = WebDriverWait(driver, 3)
-            new_count = 0
-            old_count = 0
-
-            products = []
-
-            while True:
-                old_count = new_count
-                # waiting for news to load articles
-                try:
-                    products = wait.until(EC.visibility_of_all_elements_located((By.CSS_SELECTOR, ".news-card")))
-                except:
-                    break
-                new_count = len(products)
-
-                # scroll down to last product to trigger loading
-                driver.execute_script("arguments[0].scrollIntoView();", products[len(products) - 1])
-
-                # sleep to let additional content load
-                time.sleep(2)
-
-                # if the count didn't change, we've loaded all products on the page
-                # if the count is bigger than or equal to the max, get out
-                if new_count == old_count or new_count >= max_results:
-                    break
-
-            # print results
-            for product in products:
-                link = product.get_attribute('url')
-                title = product.get_attribute('data-title')
+            if not search['bing_allowed']:
+                tqdm.write('----BING NEWS KEEPS FAILING, SEARCH SKIPPED\n')
+            elif search['bing_blocked']:
+                tqdm.write('----BING NEWS ANSWERED WITH A CAPTCHA\n')
+            elif search.get('bing_error') is not None:
+                tqdm.write('----BING NEWS SEARCH FAILED: ' + search['bing_error'] + '\n')
+
+            # articles the person or another person already has are handled without looking at their page
+            titles = {}
+            for link, title in search['cards']:
+                titles.setdefault(link, title)
+            cards = [(link, titles[link]) for link in links_to_fetch([card[0] for card in search['cards']], query, "Bing")]
+
+            # print results, the pages were downloaded and parsed when the person was gathered
+            for link, title in cards:
                 
                 Notes = ''
-
-                time.sleep(random.uniform(3,5))
+                signed = None
                 
                 try:
-                    # fetching and parsing html
-                    p = requests.get(link, headers = headers, timeout=10)
-                    soup = BeautifulSoup(p.text, features = "html.parser")
-
-                    published_date = find_date(link)
-
-                    # kill all script and style elements
-                    for script in soup(["script", "style"]):
-                        script.extract()    # rip it out
-
-                    # get text
-                    text = soup.get_text()
-
-                    # break into lines and remove leading and trailing space on each
-                    lines = (line.strip() for line in text.splitlines())
-                    # break multi-headlines into a line each
-                    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                    # drop blank lines
-                    text = '\n'.join(chunk for chunk in chunks if chunk)
+                    text, published_date = search['bing_pages'].get(link)
 
                     if "www.msn.com" in link:
                         Notes += "MSN News Link\n"
 
-                    duplicate = False
-                    # checks for duplicates in person's data
-                    for j in person_data:
-                        if j[0].strip() == link.strip():
-                            if(j[2].strip() == "Google"):
-                                j[2] = "Google,Bing"
-                            duplicate = True
-
                     # check for similarity, add note if similarity found
-                    if not duplicate:
-                        for item in person_data:
-                            sim = similar(text, item[6])
-                            if "www.msn.com" not in link:
-                                if sim >= 0.75:
-                                    tqdm.write("----TOO MUCH SIMILARITY DETECTED: " + str(round(sim * 100,2)) + "%")
-                                    Notes = "Duplicate text with: " + item[0] + "\n"
-
-                    # if there is a duplicate, add it to the person's data. If there is not, don't
-                    if duplicate: 
-                        tqdm.write('----DUPLICATE')
+                    if "www.msn.com" not in link:
+                        matches, signed = similar_articles(text)
+                        for position, sim in matches:
+                            tqdm.write("----TOO MUCH SIMILARITY DETECTED: " + str(round(sim * 100,2)) + "%")
+                            Notes = "Duplicate text with: " + person_data[position][0] + "\n"
+
+                    # double check for query in article
+                    found = found_terms(text, person_terms)
+                    items_found = all(normalize_term(item) in found for item in query_split)
+
+                    # query not double checked in article make note
+                    if not items_found:
+                        Notes += "Prompt not found in article\n"
+
+                    # append to person list if it is in the date range
+                    if(date_cutoff == None or published_date == None or published_date >= date_cutoff):
+                        tqdm.write('----Adding to SHEET...')
                         tqdm.write(title + '\n' + link + '\n')
+                        add_to_person([link + " ", title, "Bing", query, published_date, today, text, Notes], signed)
                     else:
-                        items_found = True
-                        # double check for query in article
-                        for item in query_split:
-                            if item.lower() not in text.lower():
-                                items_found = False
-
-                        # query not double checked in article make note
-                        if not items_found:
-                            Notes += "Prompt not found in article\n"
-                        outside_scope_match = False
-
-                        # locating match in other category, if there is then append query to original
-                        for item in data:
-                            if item[0].strip() == link.strip():
-                                tqdm.write("-----Match with another person's article-----")
-                                outside_scope_match = True
-                                if(query not in item[3]):
-                                    item[3] += "," + query
-
-                        # if no duplicate then append to person list
-                        if not outside_scope_match:
-                            if(date_cutoff == None or published_date == None or published_date >= date_cutoff):
-                                tqdm.write('----Adding to SHEET...')
-                                tqdm.write(title + '\n' + link + '\n')
-                                person_data.append([link + " ", title, "Bing", query, published_date, today, text, Notes])
-                            else:
-                                tqdm.write('---False Positive, Date: ' + str(published_date) + ' outside of Specified Range........')
-                                tqdm.write(title + '\n' + link + '\n')
+                        tqdm.write('---False Positive, Date: ' + str(published_date) + ' outside of Specified Range........')
+                        tqdm.write(title + '\n' + link + '\n')
                 except:
-                    outside_scope_match = False
-
-                    # looking for match in other category, if there is then append query to original
-                    for item in data:
-                        if item[0].strip() == link.strip():
-                            tqdm.write("-----Match with another person's article-----")
-                            outside_scope_match = True
-                            if(query not in item[3]):
-                                    item[3] += "," + query
-
-                    # if no duplicate then append to person list
-                    if not outside_scope_match:
-                        tqdm.write('----Adding to SHEET...')
-                        tqdm.write("ARTICLE TIMED OUT WHEN FETCHING DATA" + '\n' + link + '\n')
-                        Notes += "Timed Out\n"
-                        person_data.append([link + " ",  "ARTICLE TIMED OUT WHEN FETCHING DATA", "Bing", query, "ERROR FETCHING PUBLISHED DATE", today, "NONE", Notes])
+                    tqdm.write('----Adding to SHEET...')
+                    tqdm.write("ARTICLE TIMED OUT WHEN FETCHING DATA" + '\n' + link + '\n')
+                    Notes += "Timed Out\n"
+                    add_to_person([link + " ",  "ARTICLE TIMED OUT WHEN FETCHING DATA", "Bing", query, "ERROR FETCHING PUBLISHED DATE", today, "NONE", Notes])
 
-            driver.close()
+            # the sources whose search of the query worked and the newest article found, for the query's watermark
+            searched_by = [source for source, searched in (('Google News', search.get('google_ok', False)),
+                                                       ('Bing News', search.get('bing_ok', False))) if searched]
+            dates = [date_part(entry[4]) for entry in person_data[first_entry:] if date_part(entry[4]) is not None]
+            query_marks[query] = (searched_by, max(dates) if len(dates) > 0 else None)
 
         # writing the person/category to the master list
         tqdm.write("--------Writing Person...............................\n")
         for hit in person_data:
-            data.append([hit[0], hit[1], hit[2], hit[3], hit[4], hit[5], hit[7],'','','']) # add everything except the whole text
+            row = [hit[0], hit[1], hit[2], hit[3], hit[4], hit[5], hit[7]] # add everything except the whole text
+            row += hit[8] if len(hit) > 8 else ['','',''] # classification, only known for articles from an earlier run
+            data.append(row)
+            data_index.setdefault(canonicalize_url(row[0]), []).append(row)
 
-        Run_Log.append_row([person[0], "Entries: " + str(len(person_data)), str(date.today())])
+        # a resumed run doesn't log the people again whose rows were already written
+        if people_done >= journal.logged_through:
+            sheet_writes.append_row(Run_Log, [person[0], "Entries: " + str(len(person_data)), str(date.today())])
 
-        sheet.columns_auto_resize(0, 2)
+        sheet_writes.auto_resize(sheet, 0, 2)
     
     except Exception as e:
 
-        Run_Log.append_row(["ERROR: ", str(e) , str(date.today())])
+        if people_done >= journal.logged_through:
+            sheet_writes.append_row(Run_Log, ["ERROR: ", str(e) , str(date.today())])
+
+        sheet_writes.auto_resize(sheet, 0, 2)
+
+    # write the log of the last people every few people, so a long run shows its progress
+    people_done += 1
+    if sheets_flush_every > 0 and people_done % sheets_flush_every == 0:
+        sheet_writes.flush()
+        journal.logged(people_done)
+
+# every search is done, shut down all the chrome instances and the download session
+driver_pool.close()
+fetcher.close()
+
+# log the search sources and publishers that failed during the run
+for row in health.report():
+    sheet_writes.append_row(Run_Log, ['CIRCUIT BREAKER: ' + row[0], row[1], str(date.today())])
 
-        sheet.columns_auto_resize(0, 2)
+# log how many searches the prompts needed and how many were reused from earlier runs
+sheet_writes.append_row(Run_Log, ['QUERY PLAN', query_plan.report(), str(date.today())])
+for row in search_cache.report():
+    sheet_writes.append_row(Run_Log, ['SEARCH CACHE: ' + row[0], row[1], str(date.today())])
+if http_cache is not None:
+    sheet_writes.append_row(Run_Log, ['HTTP CACHE', http_cache.report(), str(date.today())])
+    http_cache.close()
+sheet_writes.append_row(Run_Log, ['BING SEARCH', str(bing.stats['http']) + " over http (" + str(bing.stats['pages']) + " scroll pages), "
+                        + str(bing.stats['browser']) + " in chrome", str(date.today())])
 
 ############################################################################ OPENAI API ##################################################################################
 print("\n--------Initializing OpenAI API...............................")
 
-for i in trange(len(data)): # going through all found news articles
-    if not ("ARTICLE TIMED OUT WHEN FETCHING DATA" in str(data[i][1])):
-    
-        # using openapi to find whether the news source is local, national, or international
-        news_source = ai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {
-                    "role": "user",
-                    "content": "Please give a one word response to whether the given news article site is a local, national, or international news source, if it is outside the U.S.A. it is considered international: " + str(data[i][0])
-                }
-            ]
-        )
-
-        data[i][7] = str(news_source.choices[0].message.content)
-
-        # trying to approximate what number region this news source is affiliated with
-        epa_region = ai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {
-                    "role": "user",
-                    "content": "Please only give a one number response on your best approximation on what EPA region the subject of this news article is located in: " + str(data[i][0])
-                }
-            ]
-        )
-
-        data[i][8] = str(epa_region.choices[0].message.content)
-
-
-        # finding the name of the news source of the given article link
-        news_name = ai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {
-                    "role": "user",
-                    "content": "Please respond with only the name of the news source of this article link: " + str(data[i][0])
-                }
-            ]
-        )
-
-        data[i][9] = str(news_name.choices[0].message.content)
+batch_mode = openai_batch_mode or args.batch
+
+if batch_mode:
+    # every classification goes out in one batch, the rows are kept in a job file until the results are written
+    batch_start = time.perf_counter()
+    record = openai_batch.submit(ai, data, date_cutoff, openai_model, sources = sources, query_marks = query_marks)
+    if record['batch_id'] is not None:
+        batch = openai_batch.wait(ai, record, poll_interval = openai_batch_poll, timeout = openai_batch_wait)
+        if batch.status not in openai_batch.FINISHED:
+            print("\n--------OpenAI batch is still running, run the program with --resume-batch later to write the articles...............................")
+            metrics.record('llm_classification', time.perf_counter() - batch_start)
+            sheet_writes.append_row(Run_Log, ['OPENAI BATCH', 'Batch ' + str(batch.id) + ' still running, articles are written with --resume-batch', str(date.today())])
+            sheet_writes.append_row(Run_Log, ['RUN METRICS', metrics.report(articles = len(data)), str(date.today())])
+            sheet_writes.flush()
+            # the job file has the articles now, the journal isn't needed to write them
+            journal.finish()
+            metrics.write(metrics_file, articles = len(data))
+            exit()
+        openai_batch.merge(ai, batch, record, sources = sources)
+    metrics.record('llm_classification', time.perf_counter() - batch_start)
+else:
+    # one request per article returns the reach, epa region and name of the news source, several articles at a time
+    classifier = ArticleClassifier(ai, model = openai_model, concurrency = openai_concurrency,
+                                   requests_per_minute = openai_requests_per_minute, tokens_per_minute = openai_tokens_per_minute,
+                                   metrics = metrics)
 
+    # articles classified before a resumed run stopped keep their classification
+    for row, classification in journal.classified.items():
+        data[row][7], data[row][8], data[row][9] = classification
 
-############################################################################ WRITING TO GSHEETS ##################################################################################
+    # articles from an earlier run already have their classification
+    to_classify = [i for i in range(len(data)) if not ("ARTICLE TIMED OUT WHEN FETCHING DATA" in str(data[i][1])) and data[i][7] == '']
 
-print("\n--------Writing Everything to SHEET...............................")
+    with tqdm(total = len(to_classify)) as progress:
+        classifications = classifier.classify_many([data[i][0] for i in to_classify], sources = sources, on_done = progress.update,
+                                                   on_result = lambda position, classification: journal.add_classification(to_classify[position], classification))
 
-# open first sheet
-sheet = client.open(article_name).sheet1
+    for i, classification in zip(to_classify, classifications):
+        if classification is not None:
+            data[i][7], data[i][8], data[i][9] = classification
 
-index = 1
-titles = sheet.row_values(index)
 
-# check for empty headers, if not there then populate them
-if(str(titles) == "[]"):
-    sheet.insert_row(header,index)
-
-#find the row length of the sheet
-start_rows = len(sheet.get_all_values())
+############################################################################ WRITING TO GSHEETS ##################################################################################
 
-# signal beginning of data
-sheet.append_row(['Start of Date ' + date_cutoff + ' to ' + str(date.today())])
+# the time and errors of every stage, written to the sheet with the articles
+sheet_writes.append_row(Run_Log, ['RUN METRICS', metrics.report(articles = len(data)), str(date.today())])
 
-# populate data array with articles
-index = 3
-for item in data:
-     item[4] = str(item[4])
-     index += 1
+write_articles(data, date_cutoff)
 
-# post articles, signal end of data
-sheet.append_rows(data)
-sheet.append_row(['End of Date ' + date_cutoff + ' to ' + str(date.today())])
+if batch_mode:
+    openai_batch.finish()
 
-end_rows = len(sheet.get_all_values())
+# the articles are on the sheet, the next incremental run can start where this one stopped
+for query, (searched_by, newest) in query_marks.items():
+    watermarks.update(query, searched_by, today, newest)
 
-# add yes or no cell to each row
-if(len(data) > 0):
-    sheet.add_validation('K' + str(start_rows + 2) + ":K" + str(end_rows - 1), ValidationConditionType.one_of_list, ['yes','no'], showCustomUi=True)
+journal.finish()
 
-# size cells to fit data
-sheet.columns_auto_resize(0, index)
+# the metrics again with the last sheet write, as json and as a prometheus textfile
+metrics.write(metrics_file, articles = len(data))
 
 print("\n--------DONE...............................\n")
\ No newline at end of file
@@ -0,0 +1,172 @@
+# NAME: bing_search.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Collects the news cards of a bing news search without a browser. The search page is requested over plain
+#              http, then the pages bing's infinite scroll would load are requested one after another from its
+#              infinitescrollajax endpoint, reading the url and data-title of every .news-card in the returned html,
+#              until max_results cards are found or a page brings no new cards. Only if bing sends a page without its
+#              news layout is the search opened and scrolled in a pooled chrome driver. Bing answering with an error
+#              (a 429 or 503 when it throttles us) is raised to the caller, like a captcha it counts against bing's breaker.
+#
+
+import re
+from urllib.parse import parse_qs, urlparse
+
+import requests # pip3 install requests
+from bs4 import BeautifulSoup # pip3 install beautifulsoup4
+from selenium.webdriver.common.by import By # pip3 install selenium
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from health import THROTTLE_STATUSES
+
+BING_HOST = 'bing.com'
+INFINITE_SCROLL_URL = 'https://www.bing.com/news/infinitescrollajax'
+
+_IG = re.compile(r'IG:"([0-9A-Fa-f]+)"')
+
+
+# (link, title) of every news card in a piece of bing html
+def cards_from_html(html):
+    soup = BeautifulSoup(html, features = "html.parser")
+    return [(card.get('url'), card.get('data-title')) for card in soup.select('.news-card') if card.get('url')]
+
+
+# true if bing answered with a captcha instead of results
+def is_captcha(url, html):
+    if 'captcha' in url.lower():
+        return True
+    title = re.search(r'<title>(.*?)</title>', html, re.IGNORECASE | re.DOTALL)
+    return title is not None and 'captcha' in title.group(1).lower()
+
+
+class BingNewsSearch:
+
+    # driver_pool - DriverPool used when the http search fails, None to never open a browser
+    # max_results - the search stops once it has this many cards (it can go a little over, a page holds several)
+    # rate_limiter - DomainRateLimiter to wait on before every request to bing, None for no limit
+    def __init__(self, driver_pool = None, user_agent = None, timeout = 10, max_results = 1000, rate_limiter = None):
+        self.driver_pool = driver_pool
+        self.timeout = timeout
+        self.max_results = max_results
+        self.rate_limiter = rate_limiter
+
+        self.session = requests.Session()
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+
+        self.stats = {'http': 0, 'browser': 0, 'pages': 0}
+
+    # returns the (link, title) of every card a search url finds, and whether bing answered with a captcha.
+    # raises requests' HTTPError if bing answers with an error, the browser wouldn't get further
+    def search(self, url):
+        cards, blocked = self._search_http(url)
+        if cards is not None:
+            self.stats['http'] += 1
+            return cards, blocked
+
+        self.stats['browser'] += 1
+        return self._search_browser(url)
+
+    # wait for bing's rate limit
+    def _wait(self):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(BING_HOST)
+
+    # plain http: the search page, then every infinite scroll page until no new cards come back.
+    # returns None for the cards if the page isn't a news results page the http search can read
+    def _search_http(self, url):
+        self._wait()
+        page = self.session.get(url, timeout = self.timeout)
+        if is_captcha(page.url, page.text):
+            return [], True
+        page.raise_for_status()
+
+        cards = cards_from_html(page.text)
+        if len(cards) == 0:
+            # a search without results says so, anything else is a page layout the http search doesn't know
+            return ([], False) if 'b_no' in page.text else (None, False)
+
+        # the infinite scroll pages are asked for with the query, filters and the page's IG id of the first page
+        params = {key: values[0] for key, values in parse_qs(urlparse(url).query).items()}
+        ig = _IG.search(page.text)
+        if ig is not None:
+            params['IG'] = ig.group(1)
+        params['InfiniteScroll'] = '1'
+
+        links = set(card[0] for card in cards)
+        scroll = 1
+        while len(cards) < self.max_results:
+            params['first'] = str(len(cards) + 1)
+            params['SFX'] = str(scroll)
+            self._wait()
+            fragment = self.session.get(INFINITE_SCROLL_URL, params = params, timeout = self.timeout)
+            # bing throttling the scroll pages fails the search instead of passing off the first pages as all of its results
+            if fragment.status_code in THROTTLE_STATUSES:
+                fragment.raise_for_status()
+            if fragment.status_code != 200 or is_captcha(fragment.url, fragment.text):
+                break
+            self.stats['pages'] += 1
+
+            new_cards = [card for card in cards_from_html(fragment.text) if card[0] not in links]
+            # if no new cards came back, we've loaded all of them
+            if len(new_cards) == 0:
+                break
+            links.update(card[0] for card in new_cards)
+            cards += new_cards
+            scroll += 1
+
+        return cards, False
+
+    # last resort, the search in a pooled chrome tab, scrolling until no new news cards load or max_results is reached
+    def _search_browser(self, url):
+        cards = []
+        if self.driver_pool is None:
+            return cards, False
+
+        with self.driver_pool.driver() as driver:
+            self._wait()
+            driver.get(url)
+
+            # bing sends a captcha instead of results when it thinks we are a bot
+            if 'captcha' in driver.current_url.lower() or 'captcha' in driver.title.lower():
+                return cards, True
+
+            wait = WebDriverWait(driver, 3)
+            new_count = 0
+            old_count = 0
+
+            products = []
+
+            while True:
+                old_count = new_count
+                # waiting for news to load articles
+                try:
+                    products = wait.until(EC.visibility_of_all_elements_located((By.CSS_SELECTOR, ".news-card")))
+                except:
+                    break
+                new_count = len(products)
+
+                # scroll down to last product to trigger loading
+                self._wait()
+                driver.execute_script("arguments[0].scrollIntoView();", products[len(products) - 1])
+
+                # wait for additional content to load, moves on as soon as new cards show up instead of always sleeping
+                try:
+                    WebDriverWait(driver, 2).until(lambda d: len(d.find_elements(By.CSS_SELECTOR, ".news-card")) > new_count)
+                except:
+                    pass
+
+                # if the count didn't change, we've loaded all products on the page
+                # if the count is bigger than or equal to the max, get out
+                if new_count == old_count or new_count >= self.max_results:
+                    break
+
+            # read the cards while the tab is still open, the driver goes back to the pool after this
+            for product in products:
+                cards.append((product.get_attribute('url'), product.get_attribute('data-title')))
+
+        return cards, False
@@ -0,0 +1,78 @@
+# NAME: cache_store.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: A tiny persistent key/value store on top of sqlite that the scraper uses for everything it wants to
+#              remember between runs. Each cache is one table in a sqlite file in the Article_Scraper directory, values
+#              are stored as json and can optionally expire after a time to live (in seconds).
+#
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# default database, lives next to the other files the scraper keeps (search_terms.txt, etc.)
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scraper_cache.db')
+
+
+class SqliteCache:
+
+    # path - sqlite file, created if it doesn't exist
+    # table - name of the table this cache uses, several caches can share one file
+    # ttl - seconds an entry stays valid, None means forever
+    def __init__(self, table, path = DEFAULT_DB, ttl = None):
+        self.table = table
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread = False, timeout = 30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS "' + table + '" (key TEXT PRIMARY KEY, value TEXT, updated REAL)')
+        self._conn.commit()
+
+    # returns the stored value for key, or default if it is missing or expired
+    def get(self, key, default = None):
+        with self._lock:
+            row = self._conn.execute('SELECT value, updated FROM "' + self.table + '" WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return default
+        if self.ttl is not None and time.time() - row[1] > self.ttl:
+            return default
+        return json.loads(row[0])
+
+    # store any json serializable value under key
+    def set(self, key, value):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO "' + self.table + '" (key, value, updated) VALUES (?, ?, ?)',
+                               (key, json.dumps(value), time.time()))
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM "' + self.table + '" WHERE key = ?', (key,))
+            self._conn.commit()
+
+    # removes every expired entry, returns how many were removed
+    def purge_expired(self):
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM "' + self.table + '" WHERE updated < ?', (time.time() - self.ttl,))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM "' + self.table + '"').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
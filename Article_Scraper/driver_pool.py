@@ -0,0 +1,161 @@
+# NAME: driver_pool.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: A small pool of headless Chrome drivers that article_scraper.py shares between the Google redirect
+#              resolution and the Bing scroll session. Starting Chrome is the slowest thing the scraper does, so drivers
+#              are started once, handed out again and again, and only restarted after a set amount of pages or when one breaks.
+#              Images, fonts and stylesheets are blocked and pages are loaded eagerly since we only ever need the url/DOM.
+#
+
+import atexit
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver # pip3 install selenium
+
+# url patterns that chrome will refuse to download (images, fonts, css)
+BLOCKED_RESOURCES = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.css',
+    ]
+
+
+class DriverPool:
+
+    # size - max amount of chrome instances alive at once
+    # max_pages - amount of times a driver is handed out before it is restarted (keeps memory of long runs in check)
+    # block_resources - block images, fonts and css from loading
+    def __init__(self, size = 2, max_pages = 50, block_resources = True, browser_version = "117"):
+        self.size = size
+        self.max_pages = max_pages
+        self.block_resources = block_resources
+        self.browser_version = browser_version
+
+        self._idle = queue.LifoQueue() # most recently used driver is handed out first, it is the warmest
+        self._pages = {} # driver -> amount of times it was handed out
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # make sure no chromedriver process outlives the program
+        atexit.register(self.close)
+
+    # builds a new headless chrome instance
+    def _create_driver(self):
+        options = webdriver.ChromeOptions()
+        options.add_experimental_option("excludeSwitches", ['enable-logging'])
+        options.add_argument('--headless=new')
+        options.add_argument('--log-level=3')
+        options.add_argument('--no-sandbox')
+        options.add_argument("--disable-dev-shm-usage")
+        options.set_capability("browserVersion", self.browser_version)
+        # don't wait for subresources, DOMContentLoaded is enough for redirects and news cards
+        options.page_load_strategy = 'eager'
+
+        if self.block_resources:
+            options.add_experimental_option("prefs", {
+                "profile.managed_default_content_settings.images": 2,
+                "profile.managed_default_content_settings.fonts": 2,
+            })
+
+        driver = webdriver.Chrome(options = options)
+
+        if self.block_resources:
+            try:
+                driver.execute_cdp_cmd('Network.enable', {})
+                driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_RESOURCES})
+            except Exception:
+                pass # blocking is only an optimization, the driver still works without it
+
+        return driver
+
+    # quits a driver, never raises
+    def _destroy_driver(self, driver):
+        with self._lock:
+            self._pages.pop(driver, None)
+            self._created -= 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    # get a driver from the pool, starting one if none are idle and the pool isn't full,
+    # otherwise waits for another thread to give one back
+    def acquire(self):
+        while True:
+            if self._closed:
+                raise RuntimeError("driver pool is closed")
+
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+
+            if can_create:
+                try:
+                    driver = self._create_driver()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                with self._lock:
+                    self._pages[driver] = 0
+                return driver
+
+            # pool is full, wait for a driver to come back (or for a broken one to free up a slot)
+            try:
+                return self._idle.get(timeout = 0.5)
+            except queue.Empty:
+                pass
+
+    # give a driver back to the pool. broken drivers and drivers that hit max_pages are quit
+    def release(self, driver, broken = False):
+        with self._lock:
+            self._pages[driver] = self._pages.get(driver, 0) + 1
+            worn_out = self._pages[driver] >= self.max_pages
+
+        if broken or worn_out or self._closed:
+            self._destroy_driver(driver)
+        else:
+            self._idle.put(driver)
+
+    # context manager for borrowing a driver:
+    #   with pool.driver() as driver:
+    #       driver.get(url)
+    # if anything goes wrong while it is borrowed the driver is thrown away instead of reused
+    @contextmanager
+    def driver(self):
+        driver = self.acquire()
+        try:
+            yield driver
+        except BaseException:
+            self.release(driver, broken = True)
+            raise
+        else:
+            self.release(driver)
+
+    # quit every idle driver, safe to call more than once
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy_driver(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
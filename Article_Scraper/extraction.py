@@ -0,0 +1,78 @@
+# NAME: extraction.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Reads the text, title and publish date of an article out of the page the fetcher already downloaded.
+#              newspaper3k and htmldate are both handed the html instead of the url, so no article is downloaded a
+#              second time just to parse it or to find its date.
+#
+
+from types import SimpleNamespace
+
+from newspaper import Article # pip3 install newspaper3k, pip3 install lxml[html_clean]
+from bs4 import BeautifulSoup # pip3 install beautifulsoup4
+from htmldate import find_date # pip3 install htmldate, pip3 install charset_normalizer==2.0.0
+
+
+# publish date of a downloaded page (yyyy-mm-dd) found by htmldate in its html, None if there isn't one
+def page_date(html, url = None):
+    try:
+        return find_date(html, url = url)
+    except Exception:
+        return None
+
+
+# text of a page without scripts, styles and extra whitespace
+def page_text(html):
+    soup = BeautifulSoup(html, features = "html.parser")
+
+    # kill all script and style elements
+    for script in soup(["script", "style"]):
+        script.extract()    # rip it out
+
+    # get text
+    text = soup.get_text()
+
+    # break into lines and remove leading and trailing space on each
+    lines = (line.strip() for line in text.splitlines())
+    # break multi-headlines into a line each
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    # drop blank lines
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+# builds a newspaper3k article out of a page that was already downloaded by the fetcher
+# returns None if the download or parsing failed, the same as GNews.get_full_article does
+def parse_article(url, page, config = None):
+    if not page.ok:
+        return None
+    try:
+        article = Article(url, config = config)
+        article.download(input_html = page.text)
+        article.parse()
+    except Exception:
+        return None
+    return article
+
+
+# the parts of a google article the scraper uses, as plain values that can be journaled
+# when newspaper3k finds no publish date, htmldate looks for one in the same html
+# returns None if the download or parsing failed
+def parse_google_page(url, page, config = None):
+    article = parse_article(url, page, config)
+    if article is None:
+        return None
+    publish_date = str(article.publish_date) if article.publish_date is not None else page_date(page.text, url)
+    return SimpleNamespace(url = article.url, title = article.title, text = article.text, publish_date = publish_date)
+
+
+# reads a page bing found: its text and its published date
+# returns None if the download or parsing failed
+def parse_bing_page(link, page):
+    try:
+        page.raise_for_error()
+        return page_text(page.text), page_date(page.text, link)
+    except Exception:
+        return None
@@ -0,0 +1,174 @@
+# NAME: health.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Keeps track of how each search source (Google News, Bing News) and each publisher is doing during a run.
+#              Every source and host has a circuit breaker. Throttling signals (429, 503, captchas) back off the host's
+#              rate limit exponentially, and a host that keeps failing trips its breaker so the scraper stops sending it
+#              requests (and stops waiting on its timeouts). After a cooldown one probe request is let through, if it works
+#              the breaker closes again, if not it stays open for another cooldown. A probe whose outcome is never
+#              recorded (the request raised somewhere nobody caught it) is given up on after probe_timeout seconds.
+#
+
+import threading
+import time
+
+from url_utils import domain_of
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# http statuses that mean the host wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+
+# true if an exception a search raised means the source is throttling us. gnews raises RateLimitError on a 429,
+# requests' HTTPError (raise_for_status) carries the response
+def is_throttling_error(error):
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) in THROTTLE_STATUSES:
+        return True
+    text = str(error).lower()
+    return type(error).__name__ == 'RateLimitError' or '429' in text or 'too many requests' in text or 'captcha' in text
+
+
+# raised (or put on a FetchResult) instead of sending a request to a host whose breaker is open
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+
+    # failure_threshold - failures in a row that trip the breaker
+    # cooldown - seconds the breaker stays open before a probe is let through
+    # base_backoff, max_backoff - first and largest backoff in seconds after a throttling signal, doubles every time in between
+    # probe_timeout - seconds a probe can go without its success or failure being recorded before another probe is let through
+    def __init__(self, failure_threshold = 5, cooldown = 300, base_backoff = 2, max_backoff = 120, probe_timeout = 120):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.state = CLOSED
+        self.failures = 0 # failures in a row
+        self.total_failures = 0
+        self.trips = 0 # times the breaker opened
+        self.skipped = 0 # requests not sent because the breaker was open
+        self.backoff = 0
+        self._opened_at = 0
+        self._probing = False
+        self._probe_started = 0
+
+    # true if a request may be sent
+    def allow(self):
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self._probing and time.monotonic() - self._probe_started >= self.probe_timeout:
+            self._probing = False # the probe never came back, don't stay half open for the rest of the run
+
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True # only one probe at a time
+            self._probe_started = time.monotonic()
+            return True
+
+        self.skipped += 1
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = 0
+        self._probing = False
+
+    # returns the seconds the host should be backed off for (0 if this wasn't a throttling signal)
+    def record_failure(self, throttled = False):
+        self.failures += 1
+        self.total_failures += 1
+
+        delay = 0
+        if throttled:
+            self.backoff = min(self.max_backoff, self.backoff * 2 if self.backoff else self.base_backoff)
+            delay = self.backoff
+
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+        return delay
+
+
+class HealthTracker:
+
+    # rate_limiter - DomainRateLimiter whose buckets are pushed back when a host throttles us, None to only track
+    # source_hosts - {search source name: host}, the host whose rate limit is backed off when the source throttles us
+    # breaker_settings - passed to every CircuitBreaker (failure_threshold, cooldown, base_backoff, max_backoff)
+    def __init__(self, rate_limiter = None, source_hosts = None, **breaker_settings):
+        self.rate_limiter = rate_limiter
+        self.source_hosts = source_hosts or {}
+        self.breaker_settings = breaker_settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    # breakers are keyed by host or by search source name ("Google News"). a host can be given as a url,
+    # "https://www.nytimes.com/..." and "nytimes.com" share a breaker
+    def _key(self, key):
+        return domain_of(key) if '.' in key else key
+
+    def breaker(self, key):
+        key = self._key(key)
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(**self.breaker_settings)
+        return self._breakers[key]
+
+    # true if a request to key may be sent
+    def allow(self, key):
+        with self._lock:
+            return self.breaker(key).allow()
+
+    def record_success(self, key):
+        with self._lock:
+            self.breaker(key).record_success()
+
+    # throttled - the host asked us to slow down (429, 503, captcha)
+    # retry_after - seconds the host asked us to wait, overrides the exponential backoff if it is longer
+    def record_failure(self, key, throttled = False, retry_after = None):
+        with self._lock:
+            delay = self.breaker(key).record_failure(throttled)
+        if retry_after:
+            delay = max(delay, retry_after)
+        if delay and self.rate_limiter is not None:
+            bucket = self.rate_limiter.bucket(self.source_hosts.get(key, key))
+            if bucket is not None:
+                bucket.penalize(delay)
+
+    # records the outcome of an http response, returns true if it was a success
+    def record_response(self, key, status, final_url = '', retry_after = None):
+        if status in THROTTLE_STATUSES or 'captcha' in final_url.lower():
+            self.record_failure(key, throttled = True, retry_after = retry_after)
+            return False
+        if status >= 400:
+            self.record_failure(key)
+            return False
+        self.record_success(key)
+        return True
+
+    # rows for Run_Log, one for every breaker that failed at some point during the run
+    def report(self):
+        rows = []
+        with self._lock:
+            for key, breaker in sorted(self._breakers.items()):
+                if breaker.total_failures == 0 and breaker.skipped == 0:
+                    continue
+                rows.append([key, 'Breaker ' + breaker.state + ', failures: ' + str(breaker.total_failures) + ', trips: '
+                             + str(breaker.trips) + ', requests skipped: ' + str(breaker.skipped)])
+        return rows
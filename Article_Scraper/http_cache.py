@@ -0,0 +1,175 @@
+# NAME: http_cache.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: On-disk cache of the article pages the fetcher downloads, so a publisher page that comes back run after
+#              run (or for several people and prompts) isn't downloaded from scratch every time. Page bodies are stored
+#              zlib compressed in files named after the sha256 of their text, pages with the same text share one file.
+#              A small sqlite index next to them keeps every url's body, its ETag and Last-Modified headers and when it
+#              was last used. A page stored less than fresh_hours ago is read from disk without asking the publisher,
+#              an older one is asked for with If-None-Match / If-Modified-Since and a 304 answer reuses the stored body.
+#              Once the bodies take more than max_mb, the least recently used pages are removed.
+#
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# default cache directory, lives next to the other files the scraper keeps
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'http_cache')
+
+_COLUMNS = ('url', 'digest', 'etag', 'last_modified', 'final_url', 'content_type', 'size', 'length', 'stored', 'accessed')
+
+
+# value of a response header whatever its case, default if it wasn't sent
+def header(headers, name, default = None):
+    name = name.lower()
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return default
+
+
+class HttpCache:
+
+    # directory - where the bodies and the index are kept, created if it doesn't exist
+    # max_mb - megabytes the compressed bodies may take before the least recently used are removed
+    # fresh_hours - hours a stored page is used without asking the publisher, 0 to always revalidate
+    def __init__(self, directory = CACHE_DIR, max_mb = 500, fresh_hours = 6):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.fresh_seconds = (fresh_hours or 0) * 3600
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok = True)
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread = False, timeout = 30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, digest TEXT, etag TEXT, last_modified TEXT, '
+                           'final_url TEXT, content_type TEXT, size INTEGER, length INTEGER, stored REAL, accessed REAL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+        self._conn.commit()
+        self._total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM '
+                                         '(SELECT MAX(size) AS size FROM entries GROUP BY digest)').fetchone()[0]
+
+        # fresh - pages read from disk without a request, revalidated - pages the publisher answered with 304
+        # bytes_saved - page bytes that didn't have to be downloaded because of those two
+        self.stats = {'fresh': 0, 'revalidated': 0, 'stored': 0, 'evicted': 0, 'bytes_saved': 0}
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + '.z')
+
+    # the stored entry of url (a dict of the index columns) and its text, (None, None) if there isn't one
+    def lookup(self, url):
+        with self._lock:
+            row = self._conn.execute('SELECT ' + ', '.join(_COLUMNS) + ' FROM entries WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None, None
+        entry = dict(zip(_COLUMNS, row))
+        try:
+            with open(self._path(entry['digest']), 'rb') as file:
+                text = zlib.decompress(file.read()).decode('utf-8')
+        except (OSError, zlib.error, UnicodeDecodeError):
+            # the body is gone or damaged, forget the entry so the page is downloaded again
+            with self._lock:
+                self._conn.execute('DELETE FROM entries WHERE url = ?', (url,))
+                self._conn.commit()
+            return None, None
+        return entry, text
+
+    # true if the entry was stored recently enough to be used without asking the publisher
+    def is_fresh(self, entry):
+        return time.time() - entry['stored'] < self.fresh_seconds
+
+    # headers that ask the publisher to answer 304 if the stored page didn't change, empty if it sent no validators
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    # the stored page was used instead of a download. revalidated - the publisher answered 304 with these headers
+    def used(self, entry, revalidated = False, headers = None):
+        now = time.time()
+        with self._lock:
+            if revalidated:
+                self.stats['revalidated'] += 1
+                self._conn.execute('UPDATE entries SET etag = ?, last_modified = ?, stored = ?, accessed = ? WHERE url = ?',
+                                   (header(headers, 'ETag', entry['etag']), header(headers, 'Last-Modified', entry['last_modified']),
+                                    now, now, entry['url']))
+            else:
+                self.stats['fresh'] += 1
+                self._conn.execute('UPDATE entries SET accessed = ? WHERE url = ?', (now, entry['url']))
+            self._conn.commit()
+            self.stats['bytes_saved'] += entry['length']
+
+    # stores a downloaded page (status 200) under url, unless the publisher asked for it not to be stored
+    def store(self, url, text, final_url = None, headers = None):
+        if 'no-store' in header(headers, 'Cache-Control', '').lower():
+            return
+
+        body = text.encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._path(digest)
+        now = time.time()
+
+        with self._lock:
+            shared = self._conn.execute('SELECT size FROM entries WHERE digest = ? LIMIT 1', (digest,)).fetchone()
+            if shared is not None and os.path.exists(path):
+                size = shared[0]
+            else:
+                compressed = zlib.compress(body, 6)
+                size = len(compressed)
+                os.makedirs(os.path.dirname(path), exist_ok = True)
+                temp = path + '.' + str(threading.get_ident()) + '.tmp'
+                with open(temp, 'wb') as file:
+                    file.write(compressed)
+                os.replace(temp, path)
+                self._total += size
+
+            old = self._conn.execute('SELECT digest FROM entries WHERE url = ?', (url,)).fetchone()
+            self._conn.execute('INSERT OR REPLACE INTO entries (' + ', '.join(_COLUMNS) + ') VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                               (url, digest, header(headers, 'ETag'), header(headers, 'Last-Modified'), final_url or url,
+                                header(headers, 'Content-Type'), size, len(body), now, now))
+            if old is not None and old[0] != digest:
+                self._remove_unused(old[0])
+            self._evict()
+            self._conn.commit()
+            self.stats['stored'] += 1
+
+    # deletes a body file no entry points to anymore. the lock has to be held
+    def _remove_unused(self, digest):
+        if self._conn.execute('SELECT 1 FROM entries WHERE digest = ? LIMIT 1', (digest,)).fetchone() is not None:
+            return
+        path = self._path(digest)
+        try:
+            self._total -= os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            pass
+
+    # removes the least recently used pages until the bodies fit in max_bytes. the lock has to be held
+    def _evict(self):
+        while self._total > self.max_bytes:
+            row = self._conn.execute('SELECT url, digest FROM entries ORDER BY accessed LIMIT 1').fetchone()
+            if row is None:
+                break
+            self._conn.execute('DELETE FROM entries WHERE url = ?', (row[0],))
+            self._remove_unused(row[1])
+            self.stats['evicted'] += 1
+
+    # what the cache saved during the run, for the Run_Log
+    def report(self):
+        return (str(self.stats['fresh']) + " read from disk, " + str(self.stats['revalidated']) + " not modified (304), "
+                + str(self.stats['stored']) + " stored, " + str(self.stats['evicted']) + " evicted, "
+                + str(round(self.stats['bytes_saved'] / (1024 * 1024), 1)) + " MB not downloaded")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,219 @@
+# NAME: llm_classifier.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Classifies article links with OpenAI. One request per article returns the reach of the news source
+#              (local, national or international), the EPA region of the article's subject and the name of the news
+#              source as JSON that has to match a schema, instead of three separate requests. Articles are classified
+#              concurrently by a few threads, and every request waits on two token buckets so the requests per minute
+#              and tokens per minute limits of the account are respected. With a SourceCache, only the first article of a
+#              news source that was never classified asks for everything, the others only ask for the EPA region.
+#
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limiter import TokenBucket
+from url_utils import registered_domain
+
+REACHES = ('Local', 'National', 'International')
+EPA_REGIONS = tuple(range(1, 11))
+
+SYSTEM_PROMPT = "You are a helpful assistant."
+
+# fields of the classification in the order they are written to the sheet
+FIELDS = ('reach', 'epa_region', 'news_source')
+
+FIELD_PROMPTS = {
+    'reach': "reach: whether the site is a local, national, or international news source, if it is outside the U.S.A. it is considered international.",
+    'epa_region': "epa_region: your best approximation of the number of the EPA region the subject of the article is located in.",
+    'news_source': "news_source: the name of the news source of the article.",
+    }
+
+FIELD_SCHEMAS = {
+    'reach': {'type': 'string', 'enum': list(REACHES)},
+    'epa_region': {'type': 'integer', 'enum': list(EPA_REGIONS)},
+    'news_source': {'type': 'string'},
+    }
+
+
+# json schema the response has to match when asking for fields
+def schema(fields = FIELDS):
+    return {
+        'type': 'object',
+        'properties': {field: FIELD_SCHEMAS[field] for field in fields},
+        'required': list(fields),
+        'additionalProperties': False,
+        }
+
+
+def user_prompt(link, fields = FIELDS):
+    return "Classify the news article at this link. " + ' '.join(FIELD_PROMPTS[field] for field in fields) + " Link: " + str(link)
+
+
+class ClassificationError(Exception):
+    pass
+
+
+# checks a response against the schema of fields and returns {field: value as it is written to the sheet}
+def parse_classification(content, fields = FIELDS):
+    try:
+        result = json.loads(content)
+    except (TypeError, ValueError):
+        raise ClassificationError("response is not JSON: " + str(content)[:200])
+    if not isinstance(result, dict):
+        raise ClassificationError("response is not a JSON object: " + str(content)[:200])
+
+    parsed = {}
+    if 'reach' in fields:
+        reach = result.get('reach')
+        if not isinstance(reach, str) or reach.capitalize() not in REACHES:
+            raise ClassificationError("invalid reach: " + repr(reach))
+        parsed['reach'] = reach.capitalize()
+
+    if 'epa_region' in fields:
+        epa_region = result.get('epa_region')
+        if isinstance(epa_region, str) and epa_region.strip().isdigit():
+            epa_region = int(epa_region)
+        if isinstance(epa_region, bool) or epa_region not in EPA_REGIONS:
+            raise ClassificationError("invalid epa_region: " + repr(epa_region))
+        parsed['epa_region'] = str(epa_region)
+
+    if 'news_source' in fields:
+        news_source = result.get('news_source')
+        if not isinstance(news_source, str) or news_source.strip() == '':
+            raise ClassificationError("invalid news_source: " + repr(news_source))
+        parsed['news_source'] = news_source.strip()
+
+    return parsed
+
+
+class ArticleClassifier:
+
+    # client - openai.OpenAI client, its base_url can point at any compatible endpoint
+    # concurrency - requests sent at the same time
+    # requests_per_minute, tokens_per_minute - rate limits of the account for the model, None to not limit
+    # max_tokens - most tokens a response can use, also counted against tokens_per_minute
+    # metrics - RunMetrics every classification is timed in (as llm_classification), None to not time them
+    def __init__(self, client, model = "gpt-4o-mini", concurrency = 8, requests_per_minute = 500, tokens_per_minute = 200000,
+                 max_tokens = 100, metrics = None):
+        self.client = client
+        self.model = model
+        self.concurrency = concurrency
+        self.max_tokens = max_tokens
+        self.metrics = metrics
+
+        self._requests = TokenBucket(requests_per_minute / 60, max(1, requests_per_minute / 60)) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute / 60, max(1, tokens_per_minute / 60)) if tokens_per_minute else None
+        self._lock = threading.Lock()
+
+        self.stats = {'classified': 0, 'failed': 0, 'tokens': 0}
+
+    def _messages(self, link, fields):
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt(link, fields)}
+            ]
+
+    # rough count of the tokens a request uses (about 4 characters a token), reserved before it is sent
+    def _estimate(self, messages):
+        return sum(len(message['content']) for message in messages) // 4 + self.max_tokens
+
+    def _wait(self, tokens):
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve())
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(tokens))
+        if wait > 0:
+            time.sleep(wait)
+
+    # {field: value} of an article link, raises ClassificationError if the response is invalid
+    def classify(self, link, fields = FIELDS):
+        messages = self._messages(link, fields)
+        estimate = self._estimate(messages)
+        self._wait(estimate)
+
+        response = self.client.chat.completions.create(
+            model = self.model,
+            messages = messages,
+            max_tokens = self.max_tokens,
+            response_format = {'type': 'json_schema', 'json_schema': {'name': 'article_classification', 'strict': True, 'schema': schema(fields)}}
+        )
+
+        # charge the bucket for what the request really used
+        usage = getattr(response, 'usage', None)
+        used = getattr(usage, 'total_tokens', None)
+        if isinstance(used, int):
+            if self._tokens is not None and used > estimate:
+                self._tokens.penalize((used - estimate) / self._tokens.rate)
+            with self._lock:
+                self.stats['tokens'] += used
+
+        message = response.choices[0].message
+        if getattr(message, 'refusal', None):
+            raise ClassificationError("request refused: " + str(message.refusal)[:200])
+        return parse_classification(message.content, fields)
+
+    # classifies every (position, link, source) job with the thread pool. a job with a known source only asks for the
+    # epa region. the classification goes into results[position] and to on_result as soon as it is known
+    def _run(self, jobs, results, sources, on_done, on_result):
+        def work(job):
+            position, link, source = job
+            classification = None
+            start = time.perf_counter()
+            try:
+                if source is None:
+                    result = self.classify(link)
+                    classification = [result[field] for field in FIELDS]
+                    if sources is not None:
+                        sources.set(link, result['reach'], result['news_source'])
+                else:
+                    result = self.classify(link, ('epa_region',))
+                    classification = [source[0], result['epa_region'], source[1]]
+                with self._lock:
+                    self.stats['classified'] += 1
+            except Exception as e:
+                print("\n--------OpenAI classification failed for " + str(link).strip() + ": " + str(e))
+                with self._lock:
+                    self.stats['failed'] += 1
+            if self.metrics is not None:
+                self.metrics.record('llm_classification', time.perf_counter() - start, error = classification is None)
+
+            results[position] = classification
+            if classification is not None and on_result is not None:
+                on_result(position, classification)
+            if on_done is not None:
+                on_done()
+
+        if len(jobs) == 0:
+            return
+        with ThreadPoolExecutor(max_workers = self.concurrency) as pool:
+            list(pool.map(work, jobs))
+
+    # [reach, epa region, news source] of every link in order, None for the links whose request failed.
+    # sources - SourceCache, the reach and name of sources in it are not asked for again and new sources are added to it
+    # on_done - called after every link, on_result - called with (position of the link, classification) for every link classified
+    def classify_many(self, links, sources = None, on_done = None, on_result = None):
+        results = [None] * len(links)
+
+        # the first article of every unknown source is asked everything, so its source is known for the rest
+        first, rest, domains = [], [], set()
+        for i, link in enumerate(links):
+            domain = registered_domain(link)
+            if sources is not None and (domain in domains or link in sources):
+                rest.append(i)
+            else:
+                domains.add(domain)
+                first.append(i)
+
+        self._run([(i, links[i], None) for i in first], results, sources, on_done, on_result)
+
+        # the rest only need the epa region, unless asking about their source failed above
+        self._run([(i, links[i], sources.get(links[i])) for i in rest], results, sources, on_done, on_result)
+
+        return results
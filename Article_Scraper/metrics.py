@@ -0,0 +1,146 @@
+# NAME: metrics.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Times every stage of a run (sheet read, query expansion, google search, link resolution, bing search,
+#              article download, extraction, similarity check, classification, sheet write) and counts its calls and
+#              errors, so a slow run shows which stage to scale. At the end of a run the p50, p95 and max latency of
+#              every stage go into one summary row of the Run_Log, a JSON file and a Prometheus textfile (for the
+#              node_exporter textfile collector), both next to article_scraper.py.
+#
+
+import json
+import math
+import os
+import threading
+import time
+
+METRICS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run_metrics') # .json and .prom are added
+
+
+# value at fraction q of sorted values (nearest rank)
+def percentile(values, q):
+    if len(values) == 0:
+        return 0.0
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+class _Timer:
+
+    def __init__(self):
+        self.error = False
+
+    # counts the timed call as an error even though it didn't raise
+    def fail(self):
+        self.error = True
+
+
+class _Timing:
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+        self.timer = _Timer()
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.timer
+
+    def __exit__(self, kind, value, traceback):
+        self.metrics.record(self.stage, time.perf_counter() - self.start, error = self.timer.error or kind is not None)
+        return False
+
+
+class RunMetrics:
+
+    def __init__(self):
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self._times = {} # stage -> seconds of every call, in the order the stages were first seen
+        self._errors = {} # stage -> calls that failed
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, error = False):
+        with self._lock:
+            self._times.setdefault(stage, []).append(seconds)
+            self._errors[stage] = self._errors.get(stage, 0) + (1 if error else 0)
+
+    # with metrics.time('stage') as timer: ... times the block, raising (or timer.fail()) counts it as an error
+    def time(self, stage):
+        return _Timing(self, stage)
+
+    # function that calls function and times it under stage. failed(result) tells if a result counts as an error
+    def timed(self, stage, function, failed = None):
+        def timed_function(*args, **kwargs):
+            with self.time(stage) as timer:
+                result = function(*args, **kwargs)
+                if failed is not None and failed(result):
+                    timer.fail()
+            return result
+        return timed_function
+
+    # {stage: {count, errors, total, p50, p95, max}}, seconds
+    def summary(self):
+        with self._lock:
+            stages = {stage: sorted(times) for stage, times in self._times.items()}
+            errors = dict(self._errors)
+        return {stage: {'count': len(times), 'errors': errors.get(stage, 0), 'total': sum(times),
+                        'p50': percentile(times, 0.5), 'p95': percentile(times, 0.95), 'max': times[-1] if times else 0.0}
+                for stage, times in stages.items()}
+
+    def duration(self):
+        return time.perf_counter() - self._start
+
+    # text of the Run_Log summary row: one line per stage
+    def report(self, articles = None):
+        lines = []
+        duration = self.duration()
+        line = "run " + str(round(duration, 1)) + " s"
+        if articles is not None:
+            line += ", " + str(articles) + " articles (" + str(round(articles / duration, 2) if duration > 0 else 0) + "/s)"
+        lines.append(line)
+        for stage, values in self.summary().items():
+            lines.append(stage + ": " + str(values['count']) + " calls, " + str(values['errors']) + " errors, p50 "
+                         + str(round(values['p50'] * 1000)) + " ms, p95 " + str(round(values['p95'] * 1000)) + " ms, max "
+                         + str(round(values['max'] * 1000)) + " ms")
+        return '\n'.join(lines)
+
+    # writes path.json and path.prom, each written to a temporary file first so a reader never sees half of it
+    def write(self, path = METRICS_FILE, articles = None):
+        summary = self.summary()
+        duration = self.duration()
+
+        values = {'started': self.started, 'duration': duration, 'articles': articles, 'stages': summary}
+        with open(path + '.json.tmp', 'w', encoding = 'utf-8') as file:
+            json.dump(values, file, indent = 1)
+        os.replace(path + '.json.tmp', path + '.json')
+
+        lines = [
+            '# HELP scraper_run_duration_seconds Duration of the last run.',
+            '# TYPE scraper_run_duration_seconds gauge',
+            'scraper_run_duration_seconds ' + repr(duration),
+            '# HELP scraper_run_timestamp_seconds When the last run started.',
+            '# TYPE scraper_run_timestamp_seconds gauge',
+            'scraper_run_timestamp_seconds ' + repr(self.started),
+            ]
+        if articles is not None:
+            lines += ['# HELP scraper_run_articles Articles the last run wrote to the sheet.',
+                      '# TYPE scraper_run_articles gauge',
+                      'scraper_run_articles ' + str(articles)]
+        lines += ['# HELP scraper_stage_errors Calls of a stage that failed in the last run.',
+                  '# TYPE scraper_stage_errors gauge']
+        lines += ['scraper_stage_errors{stage="' + stage + '"} ' + str(values['errors']) for stage, values in summary.items()]
+        lines += ['# HELP scraper_stage_latency_seconds Latency of the calls of a stage in the last run.',
+                  '# TYPE scraper_stage_latency_seconds summary']
+        for stage, values in summary.items():
+            label = 'stage="' + stage + '"'
+            lines += ['scraper_stage_latency_seconds{' + label + ',quantile="0.5"} ' + repr(values['p50']),
+                      'scraper_stage_latency_seconds{' + label + ',quantile="0.95"} ' + repr(values['p95']),
+                      'scraper_stage_latency_seconds{' + label + ',quantile="1"} ' + repr(values['max']),
+                      'scraper_stage_latency_seconds_sum{' + label + '} ' + repr(values['total']),
+                      'scraper_stage_latency_seconds_count{' + label + '} ' + str(values['count'])]
+        with open(path + '.prom.tmp', 'w', encoding = 'utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(path + '.prom.tmp', path + '.prom')
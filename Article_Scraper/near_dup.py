@@ -0,0 +1,122 @@
+# NAME: near_dup.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Finds articles whose text is nearly the same as an article found before, without comparing the new article
+#              to every old one. Each text is broken into overlapping word shingles and summarized by a MinHash signature,
+#              whose matching positions estimate the Jaccard similarity of the two shingle sets. The signature is cut into
+#              bands and each band is hashed into a bucket (locality sensitive hashing), only articles that share a bucket
+#              are candidates, so a lookup costs about the same no matter how many articles are in the index.
+#              Optionally the candidates are checked again with the exact jaccard similarity of their shingle sets.
+#
+
+import random
+import re
+import zlib
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD = re.compile(r'\w+')
+
+
+# set of hashed word shingles (groups of `size` words in a row) of a text
+def shingles(text, size = 5):
+    words = _WORD.findall(text.lower())
+    if len(words) == 0:
+        return set()
+    if len(words) <= size:
+        return {zlib.crc32(' '.join(words).encode('utf-8'))}
+    return {zlib.crc32(' '.join(words[i:i + size]).encode('utf-8')) for i in range(len(words) - size + 1)}
+
+
+# fraction of positions where two signatures agree, estimates the jaccard similarity of the texts
+def estimate_jaccard(a, b):
+    if len(a) == 0 or len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class NearDuplicateIndex:
+
+    # threshold - similarity at which two texts count as duplicates (0.75 like the old SequenceMatcher check)
+    # num_perm - length of the minhash signature, longer is more accurate and slower
+    # bands - amount of lsh bands, num_perm / bands rows each. more bands finds more candidates
+    # shingle_size - words per shingle
+    # exact_check - confirm candidates with the exact jaccard of their shingles (keeps the shingle sets in memory)
+    def __init__(self, threshold = 0.75, num_perm = 128, bands = 32, shingle_size = 5, exact_check = False):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm has to be a multiple of bands")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.exact_check = exact_check
+
+        # the same seed every time so signatures of the same text always match
+        rand = random.Random(1)
+        self._perms = [(rand.randrange(1, _PRIME), rand.randrange(0, _PRIME)) for i in range(num_perm)]
+
+        self._buckets = {} # (band number, band values) -> keys
+        self._signatures = {} # key -> signature
+        self._order = {} # key -> position it was added in, matches are reported in that order
+        self._shingles = {} # key -> shingle set, only with exact_check
+
+    # minhash signature of a text (or of its shingle set), an empty tuple if the text has no words
+    def signature(self, text = None, hashes = None):
+        if hashes is None:
+            hashes = shingles(text, self.shingle_size)
+        if len(hashes) == 0:
+            return ()
+        return tuple(min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in self._perms)
+
+    def _bands(self, signature):
+        for band in range(self.bands):
+            yield (band, signature[band * self.rows:(band + 1) * self.rows])
+
+    # adds a text to the index under key. a signature (and shingle set) that was already computed can be given instead of the text
+    def add(self, key, text = None, signature = None, hashes = None):
+        if signature is None:
+            if hashes is None:
+                hashes = shingles(text, self.shingle_size)
+            signature = self.signature(hashes = hashes)
+        if len(signature) == 0:
+            return signature
+
+        self._signatures[key] = signature
+        self._order.setdefault(key, len(self._order))
+        if self.exact_check and hashes is not None:
+            self._shingles[key] = hashes
+        for band in self._bands(signature):
+            self._buckets.setdefault(band, []).append(key)
+        return signature
+
+    # returns (key, similarity) for every indexed text at or above the threshold, in the order they were added.
+    # similarity is the estimated jaccard, or the exact jaccard when exact_check is on and the shingle set is known
+    def query(self, text = None, signature = None, hashes = None):
+        if signature is None:
+            if hashes is None:
+                hashes = shingles(text, self.shingle_size)
+            signature = self.signature(hashes = hashes)
+        if len(signature) == 0:
+            return []
+
+        candidates = set()
+        for band in self._bands(signature):
+            candidates.update(self._buckets.get(band, ()))
+
+        matches = []
+        for key in sorted(candidates, key = self._order.__getitem__):
+            if self.exact_check and hashes is not None and key in self._shingles:
+                score = len(hashes & self._shingles[key]) / len(hashes | self._shingles[key])
+            else:
+                score = estimate_jaccard(signature, self._signatures[key])
+            if score >= self.threshold:
+                matches.append((key, score))
+        return matches
+
+    def __len__(self):
+        return len(self._signatures)
@@ -0,0 +1,156 @@
+# NAME: openai_batch.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Classifies the articles of a run with the OpenAI Batch API instead of one request at a time, for big
+#              backfills where cost matters more than getting the results right away. Every classification request is
+#              written to a JSONL file, uploaded and submitted as one batch, which is polled until it finishes. The
+#              results are matched back to their rows by custom_id. The rows and the batch id are kept in a job file
+#              so a later run with --resume-batch can pick the results up if the program exited before they were done.
+#
+
+import json
+import os
+import time
+from datetime import date, datetime
+
+from llm_classifier import FIELDS, SYSTEM_PROMPT, ClassificationError, parse_classification, schema, user_prompt
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+JOB_FILE = os.path.join(DIRECTORY, 'batch_job.json')
+REQUESTS_FILE = os.path.join(DIRECTORY, 'batch_requests.jsonl')
+
+ENDPOINT = '/v1/chat/completions'
+FINISHED = ('completed', 'failed', 'expired', 'cancelled')
+
+
+# one line of the batch file, asking for fields about the article link
+def batch_request(custom_id, link, fields, model, max_tokens = 100):
+    return {
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': ENDPOINT,
+        'body': {
+            'model': model,
+            'messages': [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt(link, fields)}
+                ],
+            'max_tokens': max_tokens,
+            'response_format': {'type': 'json_schema', 'json_schema': {'name': 'article_classification', 'strict': True, 'schema': schema(fields)}},
+            },
+        }
+
+
+# writes the batch file for the rows of data that still need a classification and submits it.
+# sources - SourceCache, rows of known news sources only ask for the epa region
+# query_marks - {query: (sources, newest publish date)} of the run's searches, kept with the job so the watermarks can be
+#               saved once its articles are written, even by a later --resume-batch
+# returns the job record, which is also saved to job_file
+def submit(client, data, date_cutoff, model, sources = None, max_tokens = 100, requests_file = REQUESTS_FILE, job_file = JOB_FILE,
+           query_marks = None):
+    jobs = {}
+    with open(requests_file, 'w', encoding = 'utf-8') as file:
+        for i, row in enumerate(data):
+            if "ARTICLE TIMED OUT WHEN FETCHING DATA" in str(row[1]) or row[7] != '':
+                continue
+            fields = ('epa_region',) if sources is not None and row[0] in sources else FIELDS
+            custom_id = 'row-' + str(i)
+            jobs[custom_id] = list(fields)
+            file.write(json.dumps(batch_request(custom_id, row[0], fields, model, max_tokens)) + '\n')
+
+    record = {'batch_id': None, 'created': str(datetime.now()), 'date_cutoff': date_cutoff, 'jobs': jobs, 'data': data,
+              'query_marks': query_marks or {}, 'searched_on': str(date.today())}
+    if len(jobs) > 0:
+        with open(requests_file, 'rb') as file:
+            uploaded = client.files.create(file = file, purpose = 'batch')
+        batch = client.batches.create(input_file_id = uploaded.id, endpoint = ENDPOINT, completion_window = '24h')
+        record['batch_id'] = batch.id
+
+    save_job(record, job_file)
+    return record
+
+
+def save_job(record, job_file = JOB_FILE):
+    with open(job_file, 'w', encoding = 'utf-8') as file:
+        json.dump(record, file, default = str)
+
+
+# the job record of a batch that was submitted and not merged yet, None if there isn't one
+def load_job(job_file = JOB_FILE):
+    if not os.path.exists(job_file):
+        return None
+    with open(job_file, 'r', encoding = 'utf-8') as file:
+        return json.load(file)
+
+
+# removes the job record and batch file once the results are written
+def finish(job_file = JOB_FILE, requests_file = REQUESTS_FILE):
+    for path in (job_file, requests_file):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# polls the batch every poll_interval seconds until it finishes or timeout seconds pass (None waits as long as it takes).
+# returns the batch, its status says if it finished
+def wait(client, record, poll_interval = 30, timeout = None):
+    started = time.monotonic()
+    while True:
+        batch = client.batches.retrieve(record['batch_id'])
+        counts = getattr(batch, 'request_counts', None)
+        print("--------Batch " + str(batch.id) + ": " + str(batch.status) +
+              ("" if counts is None else " (" + str(counts.completed) + "/" + str(counts.total) + " done)"))
+        if batch.status in FINISHED:
+            return batch
+        if timeout is not None and time.monotonic() - started + poll_interval > timeout:
+            return batch
+        time.sleep(poll_interval)
+
+
+# writes the results of a finished batch into columns 8-10 of the job's rows, returns how many rows were classified.
+# rows whose request failed or expired are in the batch's error file, they are left unclassified like in the sheet
+# of a normal run. new news sources are added to sources
+def merge(client, batch, record, sources = None):
+    output_file_id = getattr(batch, 'output_file_id', None)
+    if output_file_id is None:
+        return 0
+
+    data = record['data']
+    merged = 0
+    for line in client.files.content(output_file_id).text.splitlines():
+        if line.strip() == '':
+            continue
+        result = json.loads(line)
+        custom_id = result.get('custom_id')
+        if custom_id not in record['jobs']:
+            continue
+        fields = record['jobs'][custom_id]
+        row = data[int(custom_id.split('-', 1)[1])]
+
+        response = result.get('response') or {}
+        if result.get('error') or response.get('status_code') != 200:
+            print("\n--------OpenAI batch request failed for " + str(row[0]).strip() + ": " + str(result.get('error') or response.get('status_code')))
+            continue
+        try:
+            message = response['body']['choices'][0]['message']
+            if message.get('refusal'):
+                raise ClassificationError("request refused: " + str(message['refusal'])[:200])
+            parsed = parse_classification(message['content'], fields)
+        except (ClassificationError, KeyError, IndexError, TypeError) as e:
+            print("\n--------OpenAI classification failed for " + str(row[0]).strip() + ": " + str(e))
+            continue
+
+        if 'reach' in parsed:
+            row[7], row[8], row[9] = parsed['reach'], parsed['epa_region'], parsed['news_source']
+            if sources is not None:
+                sources.set(row[0], parsed['reach'], parsed['news_source'])
+        else:
+            source = sources.get(row[0]) if sources is not None else None
+            if source is None:
+                continue
+            row[7], row[8], row[9] = source[0], parsed['epa_region'], source[1]
+        merged += 1
+
+    return merged
@@ -0,0 +1,78 @@
+# NAME: query_plan.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Plans the searches of a run. The prompt templates, affiliation definitions and custom prompts often
+#              expand to the same search more than once (a person under two affiliations that share a definition,
+#              templates that only differ in quoting or spacing, the same prompt for two people). Queries are reduced
+#              to a key of their lowercased, whitespace normalized terms, and every key is searched only once per run.
+#              Every person and prompt with that key gets the same search results.
+#
+
+import re
+import threading
+from concurrent.futures import Future
+
+
+# the same key for queries that search the same terms: quotes, case, spacing and the order of the terms don't matter
+# ('"Jane Doe" "EPA" ' and '"epa"  "jane doe"' both give "epa|jane doe")
+def query_key(query):
+    terms = set()
+    for term in query.split('" "'):
+        term = re.sub(r'\s+', ' ', term.replace('"', '')).strip().lower()
+        if term != '':
+            terms.add(term)
+    return '|'.join(sorted(terms))
+
+
+class QueryPlan:
+
+    # people - list of the queries of every person, like new_prompts
+    def __init__(self, people):
+        self.raw = 0
+        self.queries = {} # key -> the first query with that key, the one that is searched
+        for person in people:
+            for query in person:
+                self.raw += 1
+                self.queries.setdefault(query_key(query), query)
+
+        self._results = {} # key -> Future of the search results
+        self._lock = threading.Lock()
+        self.shared = 0 # queries answered by a search another query already did
+
+    def __len__(self):
+        return len(self.queries)
+
+    # results of search(query) for the query's key. the first caller searches, everyone else (in any thread) waits for
+    # and gets the same results. a search that raised raises again for every caller
+    def run(self, query, search):
+        key = query_key(query)
+        with self._lock:
+            future = self._results.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._results[key] = future
+            else:
+                self.shared += 1
+
+        if owner:
+            try:
+                future.set_result(search(self.queries.get(key, query)))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    # results of a search done before (read back from the run journal), the query's key isn't searched again
+    def seed(self, query, results):
+        with self._lock:
+            if query_key(query) not in self._results:
+                future = Future()
+                future.set_result(results)
+                self._results[query_key(query)] = future
+
+    # how many queries the prompts expand to and how many are searched, for the Run_Log
+    def report(self):
+        return str(self.raw) + " queries, " + str(len(self.queries)) + " unique searches"
@@ -0,0 +1,91 @@
+# NAME: rate_limiter.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Per domain token buckets that replace the blanket random sleeps the scraper used for politeness.
+#              Every host (news.google.com, bing.com and each publisher) gets its own bucket, so waiting on one host
+#              never slows down requests to another. Each request takes a token, tokens refill at `rate` per second
+#              up to `burst`. Callers that find the bucket empty reserve the next token and wait for it, so a busy
+#              host is served in order. A bit of random jitter can be added to every wait.
+#
+
+import asyncio
+import random
+import threading
+import time
+
+from url_utils import domain_of
+
+
+class TokenBucket:
+
+    # rate - tokens added per second
+    # burst - max tokens the bucket holds (requests that can go out back to back)
+    def __init__(self, rate, burst = 1):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    # takes `count` tokens and returns how many seconds the caller has to wait before using them
+    def reserve(self, count = 1):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= count
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    # pushes the next token back by `seconds`, used to back off a host that asked us to slow down
+    def penalize(self, seconds):
+        with self._lock:
+            self._tokens -= seconds * self.rate
+
+
+class DomainRateLimiter:
+
+    # default - (rate, burst) for any host without its own limit, None to not limit other hosts
+    # limits - {host: (rate, burst)}, hosts are matched with domain_of() so "www.bing.com" and "bing.com" share a bucket
+    # jitter - max random seconds added to a wait, 0 to turn it off
+    def __init__(self, default = (1, 3), limits = None, jitter = 0.0):
+        self.default = default
+        self.limits = {domain_of(host): limit for host, limit in (limits or {}).items()}
+        self.jitter = jitter
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    # the bucket of the host a url (or bare host) belongs to, None if the host isn't limited
+    def bucket(self, url):
+        host = domain_of(url)
+        with self._lock:
+            if host not in self._buckets:
+                limit = self.limits.get(host, self.default)
+                self._buckets[host] = TokenBucket(*limit) if limit is not None else None
+            return self._buckets[host]
+
+    # seconds the caller has to wait before sending a request to url
+    def reserve(self, url):
+        bucket = self.bucket(url)
+        if bucket is None:
+            return 0.0
+        wait = bucket.reserve()
+        if wait > 0 and self.jitter:
+            wait += random.uniform(0, self.jitter)
+        return wait
+
+    # blocks until a request to url is allowed
+    def acquire(self, url):
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+    # same as acquire but for the fetcher's event loop
+    async def acquire_async(self, url):
+        wait = self.reserve(url)
+        if wait > 0:
+            await asyncio.sleep(wait)
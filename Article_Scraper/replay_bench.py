@@ -0,0 +1,867 @@
+# NAME: replay_bench.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Runs the whole scraper offline on a fixed corpus, so a change to it can be measured without the network.
+#              A local fixture server answers everything the scraper would ask the internet for: the google news links
+#              redirect to the articles, bing's search and infinite scroll pages list news cards, the article pages are
+#              served from the corpus and a stub of the OpenAI chat completions endpoint classifies every article
+#              (stubs of the files and batches endpoints run --batch the same way).
+#              GNews is replaced by a fake that returns the corpus' google results and the spreadsheet by a fake that
+#              keeps the sheet in memory. The real article_scraper.py then runs from start to end (with runpy, in a
+#              copy of this folder so no cache, journal or text file of the real one is touched). Rate limits are
+#              turned off, they would only measure the configured politeness.
+#
+#              python replay_bench.py bench                         10, 100 and 1000 article runs, each in its own process
+#              python replay_bench.py run --articles 100            one run, --json FILE keeps the numbers
+#              python replay_bench.py save --articles 100 DIR       writes the generated corpus to DIR
+#              python replay_bench.py record DIR                    runs the scraper live once and writes what it found to DIR
+#
+#              run and bench replay a corpus saved in a folder with --corpus DIR (same layout as save and record write:
+#              corpus.json and an articles folder of html pages), otherwise a corpus of the asked size is generated with a
+#              fixed seed. record reads the people, prompt formatting, affiliations and date range of the real Prompts
+#              worksheet (client_key.json and article_name.txt of this folder), then runs the scraper with live GNews,
+#              google link resolution, bing and article downloads and keeps every search result and page. The sheet it
+#              writes to is the in memory one and OpenAI is the stub, so recording doesn't touch the real sheet or cost
+#              tokens. A replay measures the scraper, not google or bing.
+#              Every run reports its wall time, articles downloaded per second, the latency of every stage and the peak
+#              memory (max resident set size) of the process.
+#
+
+import argparse
+import asyncio
+import contextlib
+import email.parser
+import email.policy
+import functools
+import glob
+import html
+import io
+import json
+import os
+import random
+import resource
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OPENAI_PATH = '/openai/v1' # where the fixture server answers what would go to api.openai.com/v1
+SCRIPT = 'article_scraper.py'
+
+BING_PAGE_SIZE = 5 # cards on a bing search page and on every infinite scroll page, small so most searches scroll
+
+# the text files article_create.py makes next to the script, the scraper compares the sheet against them
+TEXT_FILES = ('search_terms.txt', 'custom_terms.txt', 'prompt_formatting.txt', 'affiliations.txt')
+
+FIRST_NAMES = ['Jane', 'Omar', 'Lucia', 'Wei', 'Priya', 'Tom', 'Ana', 'Kofi', 'Mara', 'Ivan']
+LAST_NAMES = ['Doe', 'Haddad', 'Reyes', 'Chen', 'Nair', 'Becker', 'Silva', 'Mensah', 'Kovac', 'Petrov']
+AFFILIATIONS = [('EPA', 'Environmental Protection Agency'), ('NOAA', 'National Oceanic and Atmospheric Administration'),
+                ('USGS', 'United States Geological Survey')]
+WORDS = ('water river cleanup permit county state federal report study data emissions air quality plant site soil '
+         'testing community residents meeting council funding grant program official said would could new local '
+         'public health risk levels limits rule agency review court case comment week month year lake coast storm').split()
+
+
+############################################################################## CORPUS ######################################################################################
+
+class Corpus:
+
+    # people - [first name, last name, affiliation] rows of the Prompts worksheet
+    # templates, affiliations - prompt formatting and affiliation definition lines, date_range - the Date/Time cell
+    # google - query key -> [{'id', 'title', 'published date'}], what GNews returns for the query
+    # bing - query key -> [[id, title]], the news cards of the query's bing search in order
+    # pages - article id -> html
+    def __init__(self, people, templates, affiliations, date_range, google, bing, pages):
+        self.people = people
+        self.templates = templates
+        self.affiliations = affiliations
+        self.date_range = date_range
+        self.google = google
+        self.bing = bing
+        self.pages = pages
+
+    def save(self, directory):
+        os.makedirs(os.path.join(directory, 'articles'), exist_ok = True)
+        with open(os.path.join(directory, 'corpus.json'), 'w', encoding = 'utf-8') as file:
+            json.dump({'people': self.people, 'templates': self.templates, 'affiliations': self.affiliations,
+                       'date_range': self.date_range, 'google': self.google, 'bing': self.bing}, file, indent = 1)
+        for article_id, page in self.pages.items():
+            with open(os.path.join(directory, 'articles', article_id + '.html'), 'w', encoding = 'utf-8') as file:
+                file.write(page)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'corpus.json'), 'r', encoding = 'utf-8') as file:
+            values = json.load(file)
+        pages = {}
+        for path in glob.glob(os.path.join(directory, 'articles', '*.html')):
+            with open(path, 'r', encoding = 'utf-8') as file:
+                pages[os.path.basename(path)[:-len('.html')]] = file.read()
+        return cls(values['people'], values['templates'], values['affiliations'], values['date_range'],
+                   values['google'], values['bing'], pages)
+
+
+def _paragraph(rand, words = 60):
+    return ' '.join(rand.choice(WORDS) for i in range(words)).capitalize() + '.'
+
+
+def _article_html(title, published, paragraphs):
+    body = '\n'.join('<p>' + html.escape(paragraph) + '</p>' for paragraph in paragraphs)
+    return ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>' + html.escape(title) + '</title>\n'
+            '<meta property="og:title" content="' + html.escape(title) + '">\n'
+            '<meta property="article:published_time" content="' + published + 'T08:00:00Z">\n'
+            '<script>var tracking = {"page": "article"};</script><style>nav {display: flex;}</style></head>\n'
+            '<body><nav><a href="/">Home</a> <a href="/news">News</a> <a href="/weather">Weather</a></nav>\n'
+            '<article><h1>' + html.escape(title) + '</h1>\n<time datetime="' + published + '">' + published + '</time>\n'
+            + body + '\n</article>\n<footer>Copyright Fixture Media. All rights reserved.</footer></body></html>\n')
+
+
+# a corpus of `articles` article pages with the same content for the same size every time. people get about 20 articles
+# each, split over google and bing and over the queries of their affiliation and its definition. some articles are found
+# by both searches, some are near copies of another one, some don't mention the affiliation, some write the name with a
+# non-breaking space and a few are older than the date range
+def generate_corpus(articles, seed = 1):
+    from query_plan import query_key
+
+    rand = random.Random(seed)
+    today = date.today()
+    templates = ['"First Name Last Name" "Affiliation"']
+    affiliations = [short + ' = ' + full for short, full in AFFILIATIONS]
+
+    people = []
+    queries = [] # [(query key, name, affiliation as written in the article)] of every person
+    for i in range(max(1, articles // 20)):
+        first = FIRST_NAMES[i % len(FIRST_NAMES)]
+        last = LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)] + ('' if i < 100 else str(i // 100))
+        short, full = AFFILIATIONS[i % len(AFFILIATIONS)]
+        people.append([first, last, short])
+        name = first + ' ' + last
+        queries.append([(query_key('"' + name + '" "' + short + '"'), name, short),
+                        (query_key('"' + name + '" "' + full + '"'), name, full)])
+
+    google, bing, pages = {}, {}, {}
+    texts = {} # person -> paragraphs of their articles so far, for the near copies
+    for i in range(articles):
+        person = i % len(people)
+        key, name, affiliation = rand.choice(queries[person])
+        article_id = 'a' + str(i).zfill(5)
+
+        age = rand.randint(400, 500) if rand.random() < 0.03 else rand.randint(0, 330)
+        published = str(today - timedelta(days = age))
+        title = name + ' ' + rand.choice(['talks', 'reviews', 'announces', 'questions']) + ' ' + rand.choice(WORDS) + ' ' + rand.choice(WORDS) + ' plan'
+
+        earlier = texts.setdefault(person, [])
+        if len(earlier) > 0 and rand.random() < 0.05:
+            paragraphs = list(rand.choice(earlier))
+            paragraphs[-1] = _paragraph(rand)
+        else:
+            paragraphs = [_paragraph(rand) for j in range(8)]
+            written = name.replace(' ', '\u00a0') if rand.random() < 0.05 else name
+            mention = written + ' of the ' + affiliation if rand.random() > 0.05 else written
+            paragraphs[rand.randrange(len(paragraphs))] += ' ' + mention + ' said the work would continue.'
+        earlier.append(paragraphs)
+        pages[article_id] = _article_html(title, published, paragraphs)
+
+        if rand.random() < 0.5:
+            google.setdefault(key, []).append({'id': article_id, 'title': title, 'published date': published})
+            # some google articles are found by bing too
+            if rand.random() < 0.1:
+                bing.setdefault(key, []).append([article_id, title])
+        else:
+            bing.setdefault(key, []).append([article_id, title])
+
+    return Corpus(people, templates, affiliations, '1 year', google, bing, pages)
+
+
+########################################################################### FIXTURE SERVER ##################################################################################
+
+class FixtureHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body = b'', content_type = 'text/html; charset=utf-8', headers = None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _cards(self, query, first):
+        from query_plan import query_key
+
+        cards = self.server.corpus.bing.get(query_key(query), [])[first - 1:first - 1 + BING_PAGE_SIZE]
+        return ''.join('<div class="news-card newsitem cardcommon" url="' + html.escape(self.server.base + '/article/' + article_id)
+                       + '" data-title="' + html.escape(title) + '"><a class="title">' + html.escape(title) + '</a></div>\n'
+                       for article_id, title in cards)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.count(url.path)
+
+        if url.path.startswith('/article/'):
+            page = self.server.corpus.pages.get(url.path[len('/article/'):])
+            if page is None:
+                return self._send(404, 'not found')
+            return self._send(200, page)
+
+        # google news links redirect to the article, like they do when google doesn't need batchexecute
+        if url.path.startswith('/google/rss/articles/'):
+            article_id = url.path[len('/google/rss/articles/'):]
+            return self._send(302, headers = {'Location': self.server.base + '/article/' + article_id})
+
+        if url.path == '/bing/news/search':
+            cards = self._cards(params.get('q', ''), 1)
+            if cards == '':
+                return self._send(200, '<html><body><div class="b_no">There are no results</div></body></html>')
+            return self._send(200, '<html><head><title>Bing News</title><script>_G={IG:"0F1E2D3C4B5A69788796A5B4C3D2E1F0"};</script>'
+                              '</head><body><div class="news-list">' + cards + '</div></body></html>')
+
+        if url.path == '/bing/news/infinitescrollajax':
+            return self._send(200, self._cards(params.get('q', ''), int(params.get('first', '1'))))
+
+        # the batch stubs: polling a batch and downloading its output and error files
+        if url.path.startswith(OPENAI_PATH + '/batches/'):
+            batch = self.server.poll_batch(url.path[len(OPENAI_PATH + '/batches/'):])
+            if batch is None:
+                return self._send(404, '{"error": {"message": "No such batch"}}', 'application/json')
+            return self._send(200, json.dumps(batch), 'application/json')
+        if url.path.startswith(OPENAI_PATH + '/files/') and url.path.endswith('/content'):
+            content = self.server.files.get(url.path[len(OPENAI_PATH + '/files/'):-len('/content')])
+            if content is None:
+                return self._send(404, '{"error": {"message": "No such file"}}', 'application/json')
+            return self._send(200, content, 'application/octet-stream')
+
+        self._send(404, 'not found')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        self.server.count(url.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        if url.path == OPENAI_PATH + '/chat/completions':
+            return self._send(200, json.dumps(self.server.chat_completion(json.loads(body or b'{}'))), 'application/json')
+
+        # the upload of a batch's request file, multipart form data like the openai client sends it
+        if url.path == OPENAI_PATH + '/files':
+            form = email.parser.BytesParser(policy = email.policy.HTTP).parsebytes(
+                b'Content-Type: ' + self.headers.get('Content-Type', '').encode('latin-1') + b'\r\n\r\n' + body)
+            uploads = [part for part in form.iter_parts() if part.get_param('name', header = 'content-disposition') == 'file']
+            if len(uploads) == 0:
+                return self._send(400, '{"error": {"message": "No file"}}', 'application/json')
+            return self._send(200, json.dumps(self.server.add_file(uploads[0].get_payload(decode = True), 'batch')), 'application/json')
+
+        if url.path == OPENAI_PATH + '/batches':
+            batch = self.server.create_batch(json.loads(body or b'{}'))
+            if batch is None:
+                return self._send(400, '{"error": {"message": "No such input file"}}', 'application/json')
+            return self._send(200, json.dumps(batch), 'application/json')
+
+        self._send(404, '{}', 'application/json')
+
+
+# the message of the stub chat completions endpoint: every field of the requested json schema gets its first allowed
+# value (or a fixed news source name)
+def schema_answer(body):
+    properties = body.get('response_format', {}).get('json_schema', {}).get('schema', {}).get('properties', {})
+    content = {field: (spec.get('enum') or ['Fixture News'])[0] for field, spec in properties.items()}
+    return {'role': 'assistant', 'content': json.dumps(content)}
+
+
+class FixtureServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    # answer - function(request body) -> message of the stub chat completions endpoint, schema_answer by default
+    def __init__(self, corpus, answer = schema_answer):
+        super().__init__(('127.0.0.1', 0), FixtureHandler)
+        self.corpus = corpus
+        self.answer = answer
+        self.base = 'http://127.0.0.1:' + str(self.server_address[1])
+        self.requests = {}
+        self.chat_requests = [] # body of every chat completions request, in the order they came
+        self._lock = threading.Lock()
+
+        # the batch stubs. a batch is in progress for its first batch_polls polls and then ends with batch_status.
+        # batch_result - function(request line) -> result line, None answers every request like the chat completions stub.
+        # results without a 200 response go to the batch's error file, like openai does
+        self.files = {} # file id -> content
+        self.batches = {} # batch id -> batch
+        self.batch_polls = 1
+        self.batch_status = 'completed'
+        self.batch_result = None
+
+    # requests answered per kind (article, google, bing, openai)
+    def count(self, path):
+        kind = path.strip('/').split('/')[0] or 'other'
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    # the chat completion answering a request body, its usage counts about 4 characters of the messages a token
+    def chat_completion(self, body):
+        with self._lock:
+            self.chat_requests.append(body)
+        prompt_tokens = len(json.dumps(body.get('messages', []))) // 4
+        return {
+            'id': 'chatcmpl-replay', 'object': 'chat.completion', 'created': int(time.time()), 'model': body.get('model', ''),
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': self.answer(body)}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 20, 'total_tokens': prompt_tokens + 20},
+            }
+
+    # the result line of one request of a batch
+    def _batch_result(self, request):
+        if self.batch_result is not None:
+            return self.batch_result(request)
+        return {'id': 'batch_req_' + uuid.uuid4().hex, 'custom_id': request['custom_id'], 'error': None,
+                'response': {'status_code': 200, 'request_id': uuid.uuid4().hex, 'body': self.chat_completion(request['body'])}}
+
+    def add_file(self, content, purpose):
+        file_id = 'file-' + uuid.uuid4().hex
+        with self._lock:
+            self.files[file_id] = content
+        return {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()), 'filename': file_id + '.jsonl',
+                'purpose': purpose, 'status': 'processed'}
+
+    def create_batch(self, body):
+        with self._lock:
+            content = self.files.get(body.get('input_file_id'))
+        if content is None:
+            return None
+        requests = [json.loads(line) for line in content.decode('utf-8').splitlines() if line.strip() != '']
+        batch = {'id': 'batch_' + uuid.uuid4().hex, 'object': 'batch', 'endpoint': body.get('endpoint'), 'errors': None,
+                 'input_file_id': body['input_file_id'], 'completion_window': body.get('completion_window'), 'status': 'validating',
+                 'created_at': int(time.time()), 'output_file_id': None, 'error_file_id': None,
+                 'request_counts': {'total': len(requests), 'completed': 0, 'failed': 0}, 'polls': 0, 'requests': requests}
+        with self._lock:
+            self.batches[batch['id']] = batch
+        return self._public(batch)
+
+    # the batch as the api shows it, it finishes (and its results are written) on the poll after batch_polls
+    def poll_batch(self, batch_id):
+        with self._lock:
+            batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        batch['polls'] += 1
+        if batch['status'] not in ('completed', 'failed', 'expired', 'cancelled'):
+            if batch['polls'] <= self.batch_polls:
+                batch['status'] = 'in_progress'
+            else:
+                results = [self._batch_result(request) for request in batch['requests']]
+                output = [result for result in results if (result.get('response') or {}).get('status_code') == 200]
+                errors = [result for result in results if (result.get('response') or {}).get('status_code') != 200]
+                if len(output) > 0:
+                    batch['output_file_id'] = self.add_file(''.join(json.dumps(line) + '\n' for line in output).encode('utf-8'), 'batch_output')['id']
+                if len(errors) > 0:
+                    batch['error_file_id'] = self.add_file(''.join(json.dumps(line) + '\n' for line in errors).encode('utf-8'), 'batch_output')['id']
+                batch['request_counts'] = {'total': len(results), 'completed': len(output), 'failed': len(errors)}
+                batch['status'] = self.batch_status
+        return self._public(batch)
+
+    def _public(self, batch):
+        return {key: value for key, value in batch.items() if key not in ('polls', 'requests')}
+
+    def start(self):
+        threading.Thread(target = self.serve_forever, name = 'fixture-server', daemon = True).start()
+
+    # the fixture url a request to google news or bing is sent to instead
+    def rewrite(self, url):
+        for live, local in (('https://news.google.com/', '/google/'), ('https://www.bing.com/', '/bing/')):
+            if url.startswith(live):
+                return self.base + local + url[len(live):]
+        return url
+
+
+############################################################################ FAKE SERVICES ##################################################################################
+
+# GNews that answers with the corpus' google results, as news.google.com links the fixture server redirects
+def fake_gnews(corpus):
+    from query_plan import query_key
+
+    class GNews:
+
+        def __init__(self, language = 'en', country = 'US', max_results = 100, period = None, start_date = None,
+                     end_date = None, exclude_websites = None, proxy = None):
+            self.max_results = max_results
+            self.start_date = start_date
+            self.end_date = end_date
+
+        def get_news(self, key):
+            # like gnews, a search for more than 100 results drops the date range of the instance
+            if self.max_results > 100:
+                self.start_date = self.end_date = None
+            return [{'title': article['title'], 'description': article['title'], 'published date': article['published date'],
+                     'url': 'https://news.google.com/rss/articles/' + article['id'] + '?oc=5',
+                     'publisher': {'href': '', 'title': 'Fixture Media'}}
+                    for article in corpus.google.get(query_key(key), [])[:self.max_results]]
+
+    module = types.ModuleType('gnews')
+    module.GNews = GNews
+    return module
+
+
+class FakeWorksheet:
+
+    def __init__(self, sheet_id, title, values = None, rows = 200, cols = 11):
+        self.id = sheet_id
+        self.title = title
+        self.values = [list(row) for row in (values or [])]
+        self.row_count = rows
+        self.col_count = cols
+
+    def get_all_values(self):
+        return [list(row) for row in self.values]
+
+    def col_values(self, col):
+        values = [row[col - 1] if col <= len(row) else '' for row in self.values]
+        while len(values) > 0 and values[-1] == '':
+            values.pop()
+        return values
+
+    def _write(self, row, col, rows):
+        for i, cells in enumerate(rows):
+            while len(self.values) <= row + i:
+                self.values.append([])
+            line = self.values[row + i]
+            for j, cell in enumerate(cells.get('values', [])):
+                while len(line) <= col + j:
+                    line.append('')
+                line[col + j] = cell.get('userEnteredValue', {}).get('stringValue', '')
+
+
+# spreadsheet kept in memory, batch_update applies the requests SheetWriteBuffer sends
+class FakeSpreadsheet:
+
+    def __init__(self, corpus):
+        prompts = [[''] * 3 for i in range(6)]
+        prompts[2][0] = '\n'.join(corpus.templates)
+        prompts[2][2] = '\n'.join(corpus.affiliations)
+        prompts[4][2] = corpus.date_range
+        prompts[5] = ['First Name', 'Last Name', 'Affiliation']
+        self.sheets = [FakeWorksheet(0, 'Article_Links'), FakeWorksheet(1, 'Prompts', prompts + corpus.people),
+                       FakeWorksheet(2, 'Prompt_History', [['Changes', 'Date']]), FakeWorksheet(3, 'Run_Log', [['Person', 'Log', 'Date']])]
+        self.batches = 0
+
+    def worksheets(self):
+        return list(self.sheets)
+
+    def worksheet(self, title):
+        return [sheet for sheet in self.sheets if sheet.title == title][0]
+
+    def batch_update(self, body):
+        self.batches += 1
+        sheets = {sheet.id: sheet for sheet in self.sheets}
+        for request in body['requests']:
+            if 'appendCells' in request:
+                sheet = sheets[request['appendCells']['sheetId']]
+                sheet._write(len(sheet.col_values(1)), 0, request['appendCells']['rows'])
+            elif 'updateCells' in request:
+                start = request['updateCells']['start']
+                sheets[start['sheetId']]._write(start['rowIndex'], start['columnIndex'], request['updateCells']['rows'])
+            elif 'appendDimension' in request:
+                sheets[request['appendDimension']['sheetId']].row_count += request['appendDimension']['length']
+        return {}
+
+
+############################################################################### TIMING #####################################################################################
+
+class StageTimes:
+
+    def __init__(self):
+        self.times = {} # stage -> seconds of every call
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.times.setdefault(stage, []).append(seconds)
+
+    # replaces owner.name (a function or method, plain or async) with one that times every call under stage
+    def wrap(self, owner, name, stage):
+        function = getattr(owner, name)
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.add(stage, time.perf_counter() - start)
+        else:
+            @functools.wraps(function)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.add(stage, time.perf_counter() - start)
+        setattr(owner, name, timed)
+
+    # {stage: {calls, total, mean, p50, p95}} in seconds
+    def report(self):
+        report = {}
+        for stage, times in sorted(self.times.items()):
+            times = sorted(times)
+            report[stage] = {'calls': len(times), 'total': sum(times), 'mean': sum(times) / len(times),
+                             'p50': times[len(times) // 2], 'p95': times[min(len(times) - 1, int(len(times) * 0.95))]}
+        return report
+
+
+# makes every new instance of cls ignore the given keyword arguments and use these values instead
+def force_settings(cls, **values):
+    init = cls.__init__
+
+    @functools.wraps(init)
+    def __init__(self, *args, **kwargs):
+        kwargs.update(values)
+        init(self, *args, **kwargs)
+    cls.__init__ = __init__
+
+
+# max resident set size of this process in MB
+def peak_memory_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+################################################################################ REPLAY #####################################################################################
+
+# copies this folder's modules to a new folder the scraper runs in, and imports them from there from now on
+# live - also copy the sheet's key, name and the text files, for record
+def prepare_workdir(live = False):
+    workdir = tempfile.mkdtemp(prefix = 'replay_bench_')
+    for path in glob.glob(os.path.join(HERE, '*.py')):
+        if os.path.basename(path) != os.path.basename(__file__):
+            shutil.copy(path, workdir)
+    with open(os.path.join(workdir, 'article_name.txt'), 'w') as file:
+        file.write('Replay Benchmark\n')
+    with open(os.path.join(workdir, 'client_key.json'), 'w') as file:
+        file.write('{}')
+    for name in TEXT_FILES:
+        open(os.path.join(workdir, name), 'w').close()
+    if live:
+        for name in ('article_name.txt', 'client_key.json') + TEXT_FILES:
+            if os.path.exists(os.path.join(HERE, name)):
+                shutil.copy(os.path.join(HERE, name), workdir)
+    sys.path.insert(0, workdir)
+    return workdir
+
+
+# runs article_scraper.py from start to end in the folder prepare_workdir made, returns its wall time and exit code
+def run_scraper(workdir, verbose = False, extra_args = ()):
+    sys.argv = [os.path.join(workdir, SCRIPT)] + list(extra_args)
+    output = sys.stdout if verbose else io.StringIO()
+    exit_code = 0
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            runpy.run_path(os.path.join(workdir, SCRIPT), run_name = '__main__')
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+    return time.perf_counter() - start, exit_code
+
+
+# sends the scraper's OpenAI requests (chat completions and batches) to the fixture server's stubs
+def use_openai_stub(server):
+    from openai import OpenAI
+    import openai_batch
+    from llm_classifier import ArticleClassifier
+
+    # the scraper's client has an empty key, which the openai client refuses, and has to talk to the stub
+    force_settings(OpenAI, api_key = 'replay-bench', base_url = server.base + OPENAI_PATH)
+    # the stub batch is done on its second poll, waiting the configured poll interval would only measure that interval
+    wait = openai_batch.wait
+    openai_batch.wait = lambda client, record, poll_interval = 30, timeout = None: wait(client, record, poll_interval = 0.1, timeout = timeout)
+    force_settings(ArticleClassifier, requests_per_minute = None, tokens_per_minute = None)
+
+
+# runs article_scraper.py once on the corpus in the folder prepare_workdir made, returns the numbers of the run
+def replay(corpus, workdir, verbose = False, keep = False, extra_args = ()):
+    server = FixtureServer(corpus)
+    server.start()
+
+    import requests
+    import sheet_access
+    import extraction
+    from rate_limiter import DomainRateLimiter
+    from llm_classifier import ArticleClassifier
+    from query_plan import QueryPlan
+    from url_resolver import GoogleNewsResolver
+    from bing_search import BingNewsSearch
+    from article_fetcher import ArticleFetcher
+    from term_matcher import TermMatcher
+    from near_dup import NearDuplicateIndex
+    from sheet_writer import SheetWriteBuffer
+
+    # the live services, swapped for the fixtures
+    sys.modules['gnews'] = fake_gnews(corpus)
+    spreadsheet = FakeSpreadsheet(corpus)
+    sheet_access.open_spreadsheet = lambda key_file, name, quota = None: spreadsheet
+    sheet_access.worksheets_by_title = lambda spreadsheet, quota = None: {sheet.title: sheet for sheet in spreadsheet.worksheets()}
+    send = requests.Session.request
+    requests.Session.request = lambda session, method, url, *args, **kwargs: send(session, method, server.rewrite(url), *args, **kwargs)
+
+    use_openai_stub(server)
+    force_settings(DomainRateLimiter, default = None, limits = {}, jitter = 0)
+
+    stages = StageTimes()
+    stages.wrap(QueryPlan, 'run', 'search query')
+    stages.wrap(GoogleNewsResolver, 'resolve', 'resolve google link')
+    stages.wrap(BingNewsSearch, 'search', 'bing search')
+    stages.wrap(ArticleFetcher, '_fetch', 'download article')
+    stages.wrap(extraction, 'parse_google_page', 'extract google article')
+    stages.wrap(extraction, 'parse_bing_page', 'extract bing article')
+    stages.wrap(TermMatcher, 'find', 'check search terms')
+    stages.wrap(NearDuplicateIndex, 'query', 'find similar text')
+    stages.wrap(ArticleClassifier, 'classify', 'classify article')
+    stages.wrap(sheet_access.SheetSnapshot, '__init__', 'read sheet')
+    stages.wrap(SheetWriteBuffer, 'flush', 'write sheet')
+
+    wall, exit_code = run_scraper(workdir, verbose, extra_args)
+    server.shutdown()
+
+    articles = spreadsheet.worksheet('Article_Links').values
+    rows = [row for row in articles[1:] if len(row) > 1 and row[0] != '']
+    log = spreadsheet.worksheet('Run_Log').values
+    downloads = len(stages.times.get('download article', []))
+    result = {
+        'corpus_articles': len(corpus.pages),
+        'people': len(corpus.people),
+        'wall_seconds': wall,
+        'articles_downloaded': downloads,
+        'articles_per_second': downloads / wall if wall > 0 else 0.0,
+        'rows_written': len(rows),
+        'errors': [row[1] for row in log if len(row) > 1 and row[0].startswith('ERROR')],
+        'exit_code': exit_code,
+        'requests': server.requests,
+        'sheet_batches': spreadsheet.batches,
+        'peak_memory_mb': peak_memory_mb(),
+        'stages': stages.report(),
+        }
+
+    if keep:
+        result['workdir'] = workdir
+    else:
+        shutil.rmtree(workdir, ignore_errors = True)
+    return result
+
+
+def print_result(result):
+    print('\n' + str(result['corpus_articles']) + ' articles, ' + str(result['people']) + ' people: '
+          + str(round(result['wall_seconds'], 2)) + ' s, ' + str(round(result['articles_per_second'], 1)) + ' articles/s, '
+          + str(result['rows_written']) + ' rows written, peak memory ' + str(round(result['peak_memory_mb'], 1)) + ' MB')
+    if result['exit_code'] != 0 or len(result['errors']) > 0:
+        print('    exit code ' + str(result['exit_code']) + ', errors: ' + '; '.join(result['errors']))
+    print('    {:<24} {:>7} {:>10} {:>10} {:>10}'.format('stage', 'calls', 'total s', 'mean ms', 'p95 ms'))
+    for stage, times in result['stages'].items():
+        print('    {:<24} {:>7} {:>10.3f} {:>10.2f} {:>10.2f}'.format(stage, times['calls'], times['total'],
+                                                                       times['mean'] * 1000, times['p95'] * 1000))
+
+
+################################################################################ RECORD #####################################################################################
+
+# what a live run of the scraper found, kept as it comes in and turned into a Corpus at the end
+class Recorder:
+
+    def __init__(self):
+        self.google = {} # query key -> [(google link, title, published date)]
+        self.resolved = {} # google link -> publisher link
+        self.bing = {} # query key -> [(link, title)]
+        self.pages = {} # link -> html
+        self._lock = threading.Lock()
+
+    # wraps the live GNews search, the google link resolver, the bing search and the article downloads
+    def wrap(self, GNews, GoogleNewsResolver, BingNewsSearch, ArticleFetcher):
+        from query_plan import query_key
+        recorder = self
+
+        get_news = GNews.get_news
+        @functools.wraps(get_news)
+        def recorded_get_news(gnews, key):
+            articles = get_news(gnews, key)
+            with recorder._lock:
+                recorder.google[query_key(key)] = [(article['url'], article.get('title', ''), article.get('published date', ''))
+                                                   for article in articles]
+            return articles
+        GNews.get_news = recorded_get_news
+
+        resolve = GoogleNewsResolver.resolve
+        @functools.wraps(resolve)
+        def recorded_resolve(resolver, url):
+            actual_url = resolve(resolver, url)
+            with recorder._lock:
+                recorder.resolved[url] = actual_url
+            return actual_url
+        GoogleNewsResolver.resolve = recorded_resolve
+
+        search = BingNewsSearch.search
+        @functools.wraps(search)
+        def recorded_search(bing, url):
+            cards, blocked = search(bing, url)
+            query = parse_qs(urlparse(url).query).get('q', [''])[0]
+            with recorder._lock:
+                recorder.bing[query_key(query)] = list(cards)
+            return cards, blocked
+        BingNewsSearch.search = recorded_search
+
+        download = ArticleFetcher._download
+        @functools.wraps(download)
+        async def recorded_download(fetcher, url):
+            result = await download(fetcher, url)
+            if result.ok and result.text is not None:
+                with recorder._lock:
+                    recorder.pages[url] = result.text
+            return result
+        ArticleFetcher._download = recorded_download
+
+    # the recorded searches and pages as a corpus, every publisher link gets an article id. a link whose page couldn't be
+    # downloaded keeps its id without a page, the fixture server answers it with a 404 like a download that failed
+    def corpus(self, people, templates, affiliations, date_range):
+        ids = {}
+        def article_id(link):
+            return ids.setdefault(link, 'r' + str(len(ids)).zfill(5))
+
+        google = {key: [{'id': article_id(self.resolved.get(link, link)), 'title': title, 'published date': published}
+                        for link, title, published in articles]
+                  for key, articles in self.google.items()}
+        bing = {key: [[article_id(link), title] for link, title in cards] for key, cards in self.bing.items()}
+        pages = {article_id(link): page for link, page in self.pages.items() if link in ids}
+        return Corpus(people, templates, affiliations, date_range, google, bing, pages)
+
+
+# the people, prompt formatting, affiliations and date range of the real Prompts worksheet
+def read_prompts(workdir):
+    import sheet_access
+
+    with open(os.path.join(workdir, 'article_name.txt'), 'r') as file:
+        name = file.readlines()[0].strip()
+    spreadsheet = sheet_access.open_spreadsheet(os.path.join(workdir, 'client_key.json'), name)
+    values = [row + [''] * (3 - len(row)) for row in spreadsheet.worksheet('Prompts').get_all_values()]
+    values += [[''] * 3 for i in range(6 - len(values))]
+
+    # the table of people starts on row 7, the same cells the scraper reads
+    people = [row[:3] for row in values[6:] if any(cell.strip() for cell in row[:3])]
+    return people, values[2][0].split('\n'), values[2][2].split('\n'), values[4][2]
+
+
+# runs article_scraper.py once against the live searches and publishers and saves what it found as a corpus in directory
+def record(directory, workdir, verbose = False, keep = False, extra_args = ()):
+    import gnews # pip3 install gnews
+    import sheet_access
+    from url_resolver import GoogleNewsResolver
+    from bing_search import BingNewsSearch
+    from article_fetcher import ArticleFetcher
+
+    people, templates, affiliations, date_range = read_prompts(workdir)
+    prompts = Corpus(people, templates, affiliations, date_range, {}, {}, {})
+
+    # the run writes to a sheet in memory, so the real one isn't touched and every article found is downloaded
+    server = FixtureServer(prompts)
+    server.start()
+    spreadsheet = FakeSpreadsheet(prompts)
+    sheet_access.open_spreadsheet = lambda key_file, name, quota = None: spreadsheet
+    sheet_access.worksheets_by_title = lambda spreadsheet, quota = None: {sheet.title: sheet for sheet in spreadsheet.worksheets()}
+    use_openai_stub(server)
+
+    recorder = Recorder()
+    recorder.wrap(gnews.GNews, GoogleNewsResolver, BingNewsSearch, ArticleFetcher)
+    wall, exit_code = run_scraper(workdir, verbose, extra_args)
+    server.shutdown()
+
+    corpus = recorder.corpus(people, templates, affiliations, date_range)
+    corpus.save(directory)
+    if not keep:
+        shutil.rmtree(workdir, ignore_errors = True)
+
+    print('\nrecorded ' + str(len(corpus.people)) + ' people, ' + str(len(corpus.google)) + ' google and ' + str(len(corpus.bing))
+          + ' bing searches, ' + str(len(corpus.pages)) + ' article pages in ' + str(round(wall, 1)) + ' s to ' + directory)
+    if exit_code != 0:
+        print('    the scraper exited with code ' + str(exit_code) + ', the corpus only has what it found before that')
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Runs article_scraper.py offline on a generated or recorded corpus and reports how fast it is")
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    run = commands.add_parser('run', help = "one replay in this process")
+    run.add_argument('--articles', type = int, default = 100, help = "articles in the generated corpus")
+    run.add_argument('--corpus', help = "replay the corpus saved in this folder instead of generating one")
+    run.add_argument('--json', help = "also write the numbers of the run to this file")
+    run.add_argument('--verbose', action = 'store_true', help = "show the scraper's own output")
+    run.add_argument('--keep', action = 'store_true', help = "keep the folder the scraper ran in (caches, journal, text files)")
+    run.add_argument('scraper_args', nargs = '*', help = "arguments for article_scraper.py, after --")
+
+    bench = commands.add_parser('bench', help = "replays of several sizes, each in a new process")
+    bench.add_argument('--sizes', type = int, nargs = '+', default = [10, 100, 1000], help = "articles of every run")
+    bench.add_argument('--corpus', help = "replay the corpus saved in this folder (the sizes are ignored)")
+    bench.add_argument('--json', help = "also write the numbers of every run to this file")
+
+    save = commands.add_parser('save', help = "write the generated corpus to a folder")
+    save.add_argument('--articles', type = int, default = 100)
+    save.add_argument('directory')
+
+    rec = commands.add_parser('record', help = "run the scraper live once (sheet and openai stubbed) and save what it found to a folder")
+    rec.add_argument('--verbose', action = 'store_true', help = "show the scraper's own output")
+    rec.add_argument('--keep', action = 'store_true', help = "keep the folder the scraper ran in (caches, journal, text files)")
+    rec.add_argument('directory')
+    rec.add_argument('scraper_args', nargs = '*', help = "arguments for article_scraper.py, after --")
+
+    args = parser.parse_args()
+
+    if args.command == 'save':
+        generate_corpus(args.articles).save(args.directory)
+        return
+
+    if args.command == 'record':
+        record(args.directory, prepare_workdir(live = True), verbose = args.verbose, keep = args.keep, extra_args = args.scraper_args)
+        return
+
+    if args.command == 'run':
+        workdir = prepare_workdir()
+        corpus = Corpus.load(args.corpus) if args.corpus else generate_corpus(args.articles)
+        result = replay(corpus, workdir, verbose = args.verbose, keep = args.keep, extra_args = args.scraper_args)
+        if args.json:
+            with open(args.json, 'w') as file:
+                json.dump(result, file, indent = 1)
+        print_result(result)
+        return
+
+    # every size runs in its own process so the peak memory of one doesn't hide the next
+    results = []
+    for size in ([None] if args.corpus else args.sizes):
+        with tempfile.NamedTemporaryFile(suffix = '.json', delete = False) as file:
+            output = file.name
+        command = [sys.executable, os.path.abspath(__file__), 'run', '--json', output]
+        command += ['--corpus', args.corpus] if args.corpus else ['--articles', str(size)]
+        subprocess.run(command, check = True, stdout = subprocess.DEVNULL)
+        with open(output) as file:
+            results.append(json.load(file))
+        os.remove(output)
+        print_result(results[-1])
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent = 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# NAME: run_journal.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Append only journal of a run, so a run that crashes (or hangs, or hits a quota) after hours of searching
+#              doesn't have to start over. Every query's search results and the pages it downloaded are written as one
+#              JSON line as soon as the query is done, followed by a line when all of a person's queries are done, one
+#              per classified article and one every time the Run_Log is written. Each line is flushed to disk right away.
+#              With --resume the journal is read back: finished people are replayed without the network, a person that
+#              was cut off continues from the first query that isn't in the journal, and classified articles keep their
+#              classification. The journal is removed once the articles are written to the sheet.
+#
+
+import json
+import os
+import threading
+from types import SimpleNamespace
+
+from text_sketch import text_for_journal, text_from_journal
+
+JOURNAL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run_journal.jsonl')
+
+
+class RunJournal:
+
+    def __init__(self, path = JOURNAL_FILE):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+        # what was read back from an earlier journal
+        self.people = None # people of the run, in the order they are searched
+        self.date_cutoff = None
+        self.searches = {} # person position -> searches gathered for them, in query order
+        self.gathered = set() # positions of the people whose queries were all gathered
+        self.classified = {} # row of data -> [reach, epa region, news source]
+        self.logged_through = 0 # people whose Run_Log rows were written to the sheet
+        self._valid_size = 0 # bytes of the journal up to the last complete line
+
+    # reads the journal of an unfinished run, returns false if there is none.
+    # a half written last line (the crash happened while writing it) is ignored
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+
+        pages = {} # person position -> pages shared by the person's searches, like gather_person keeps them
+        with open(self.path, 'rb') as file:
+            for line in file:
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                self._valid_size += len(line)
+                kind = record.get('type')
+                if kind == 'run':
+                    self.people = record['people']
+                    self.date_cutoff = record['date_cutoff']
+                elif kind == 'search':
+                    person = record['person']
+                    shared = pages.setdefault(person, {'Google': {}, 'Bing': {}})
+                    search = record['search']
+                    for link, page in search['google_pages'].items():
+                        if page is not None:
+                            page = SimpleNamespace(**page)
+                            page.text = text_from_journal(page.text)
+                        shared['Google'][link] = page
+                    for link, page in search['bing_pages'].items():
+                        shared['Bing'][link] = (text_from_journal(page[0]), page[1]) if page is not None else None
+                    search['google_pages'] = shared['Google']
+                    search['bing_pages'] = shared['Bing']
+                    self.searches.setdefault(person, []).append(search)
+                elif kind == 'gathered':
+                    self.gathered.add(record['person'])
+                elif kind == 'classified':
+                    self.classified[record['row']] = record['classification']
+                elif kind == 'logged':
+                    self.logged_through = max(self.logged_through, record['through'])
+
+        return self.people is not None
+
+    # starts a new journal for a run over people, replacing any old one
+    def start(self, people, date_cutoff):
+        self.people = people
+        self.date_cutoff = date_cutoff
+        self._file = open(self.path, 'w', encoding = 'utf-8')
+        self._append({'type': 'run', 'people': people, 'date_cutoff': date_cutoff})
+
+    # keeps writing to the journal that was loaded, after dropping a half written last line
+    def resume(self):
+        with open(self.path, 'r+b') as file:
+            file.truncate(self._valid_size)
+        self._file = open(self.path, 'a', encoding = 'utf-8')
+
+    def _append(self, record):
+        line = json.dumps(record, default = str) + '\n'
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    # a gathered query of the person at position person. only the pages the query downloaded are written,
+    # google pages are namespaces of plain values (url, title, text, publish_date) and bing pages (text, published date).
+    # in low memory mode the texts are TextSketches
+    def add_search(self, person, search, google_links, bing_links):
+        record = {key: value for key, value in search.items() if key not in ('google_pages', 'bing_pages')}
+        record['google_pages'] = {}
+        for link in google_links:
+            page = search['google_pages'][link]
+            record['google_pages'][link] = dict(vars(page), text = text_for_journal(page.text)) if page is not None else None
+        record['bing_pages'] = {}
+        for link in bing_links:
+            page = search['bing_pages'][link]
+            record['bing_pages'][link] = [text_for_journal(page[0]), page[1]] if page is not None else None
+        self._append({'type': 'search', 'person': person, 'search': record})
+
+    def person_gathered(self, person):
+        self._append({'type': 'gathered', 'person': person})
+
+    def add_classification(self, row, classification):
+        self._append({'type': 'classified', 'row': row, 'classification': classification})
+
+    # the Run_Log rows of the first `through` people are on the sheet
+    def logged(self, through):
+        self._append({'type': 'logged', 'through': through})
+
+    # the run is written to the sheet, the journal isn't needed anymore
+    def finish(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,53 @@
+# NAME: search_cache.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Remembers the results of news searches for a while, so a rerun (after a crash, or after one prompt was
+#              changed) doesn't send the same search again. Results are stored in the sqlite cache under the search
+#              source, the normalized query, the date window and the max results, and expire after a time to live.
+#              Empty results are never stored, a search that was throttled often comes back empty.
+#
+
+import json
+import re
+
+from cache_store import SqliteCache
+
+
+# the same key for queries that only differ in case or spacing
+def normalize_query(query):
+    return re.sub(r'\s+', ' ', query.strip()).lower()
+
+
+class SearchCache:
+
+    # path - sqlite file the results are stored in
+    # ttl_hours - hours results are reused, 0 or None turns the cache off
+    def __init__(self, path, ttl_hours = 12):
+        self.enabled = bool(ttl_hours)
+        self.cache = SqliteCache('search_results', path = path, ttl = ttl_hours * 3600) if self.enabled else None
+        self.hits = {}
+        self.misses = {}
+
+    def _key(self, source, query, window, max_results):
+        return json.dumps([source, normalize_query(query), window, max_results], default = str)
+
+    # stored results of a search, None if it wasn't searched within the time to live
+    def get(self, source, query, window = None, max_results = None):
+        results = self.cache.get(self._key(source, query, window, max_results)) if self.enabled else None
+        counts = self.hits if results is not None else self.misses
+        counts[source] = counts.get(source, 0) + 1
+        return results
+
+    # stores the results of a search, they have to be json serializable (anything else is stored as text)
+    def set(self, source, query, results, window = None, max_results = None):
+        if not self.enabled or len(results) == 0:
+            return
+        self.cache.set(self._key(source, query, window, max_results), json.loads(json.dumps(results, default = str)))
+
+    # [source, message] rows of the hits and misses, for the Run_Log
+    def report(self):
+        return [[source, str(self.hits.get(source, 0)) + " cached, " + str(self.misses.get(source, 0)) + " searched"]
+                for source in sorted(set(self.hits) | set(self.misses))]
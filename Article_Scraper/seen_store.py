@@ -0,0 +1,59 @@
+# NAME: seen_store.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Remembers every article that was written to the Article_Links sheet in an earlier run, keyed by its
+#              canonical link. It keeps what was written for the article (title, source, search terms, published date,
+#              notes) and its OpenAI classification, so an article that comes back in a later run can be skipped
+#              before it is downloaded, parsed or sent to OpenAI again.
+#
+
+from datetime import date
+
+from cache_store import SqliteCache
+from url_utils import canonicalize_url
+
+TIMED_OUT_TITLE = "ARTICLE TIMED OUT WHEN FETCHING DATA"
+
+
+class SeenStore:
+
+    def __init__(self, path):
+        self.cache = SqliteCache('seen_articles', path = path)
+        self.hits = 0
+
+    # stored record of an article, None if it was never written
+    def get(self, link):
+        record = self.cache.get(canonicalize_url(link))
+        if record is not None:
+            self.hits += 1
+        return record
+
+    # true if the article was written in an earlier run, without counting it as a hit
+    def __contains__(self, link):
+        return canonicalize_url(link) in self.cache
+
+    # saves a row of the Article_Links sheet, merging the search terms with the ones stored before.
+    # timed out articles are not saved so they are tried again next run
+    def record(self, row):
+        if TIMED_OUT_TITLE in str(row[1]):
+            return
+
+        key = canonicalize_url(row[0])
+        record = self.cache.get(key)
+        if record is None:
+            record = {'url': row[0].strip(), 'title': row[1], 'source': row[2], 'search_terms': row[3],
+                      'published_date': str(row[4]), 'notes': row[6], 'first_seen': str(date.today())}
+        elif row[3] not in record['search_terms']:
+            record['search_terms'] += "," + row[3]
+        record['classification'] = [row[7], row[8], row[9]]
+        record['last_seen'] = str(date.today())
+        self.cache.set(key, record)
+
+    # person_data entry built from a stored article, only the search term is new. there is no text to compare
+    # and the stored classification is carried along as a 9th item so it isn't sent to OpenAI again
+    def entry(self, record, query):
+        return [record['url'] + " ", record['title'], record['source'], query, record['published_date'], str(date.today()),
+                "NONE", record['notes'] + "Found in an earlier run\n", record.get('classification') or ['', '', '']]
@@ -0,0 +1,75 @@
+# NAME: sheet_access.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Reads the google sheet with as few API requests as possible. The service account is authorized and the
+#              spreadsheet opened once, all of its worksheets come from one metadata request, and the Prompts worksheet
+#              is read in a single request and then looked at locally (cells, the people table) instead of asking the
+#              API for every cell and row. Every request waits on a rate limit so the per minute quota is respected.
+#
+
+import gspread # pip3 install gspread
+from oauth2client.service_account import ServiceAccountCredentials # pip3 install oauth2client
+
+SCOPE = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+    ]
+
+# key the sheets requests are rate limited under
+SHEETS_API = 'sheets.googleapis.com'
+
+
+# authorizes the service account in key_file and opens the spreadsheet called name
+def open_spreadsheet(key_file, name, quota = None):
+    creds = ServiceAccountCredentials.from_json_keyfile_name(key_file, SCOPE)
+    client = gspread.authorize(creds)
+    if quota is not None:
+        quota.acquire(SHEETS_API)
+    return client.open(name)
+
+
+# {title: worksheet} of every worksheet in the spreadsheet, in one request
+def worksheets_by_title(spreadsheet, quota = None):
+    if quota is not None:
+        quota.acquire(SHEETS_API)
+    return {worksheet.title: worksheet for worksheet in spreadsheet.worksheets()}
+
+
+class SheetSnapshot:
+
+    # reads every value of the worksheet in one request
+    def __init__(self, worksheet, quota = None):
+        if quota is not None:
+            quota.acquire(SHEETS_API)
+        self.values = worksheet.get_all_values()
+
+    # value of a cell (1 based like gspread), None if it is empty like worksheet.cell(row, col).value
+    def cell(self, row, col):
+        if row > len(self.values) or col > len(self.values[row - 1]):
+            return None
+        value = self.values[row - 1][col - 1]
+        return value if value != '' else None
+
+    # values of a row without the empty cells at the end, like worksheet.row_values(row)
+    def row_values(self, row):
+        if row > len(self.values):
+            return []
+        values = list(self.values[row - 1])
+        while len(values) > 0 and values[-1] == '':
+            values.pop()
+        return values
+
+    # every row from start_row down to the first empty row
+    def rows_from(self, start_row):
+        rows = []
+        row = start_row
+        while True:
+            values = self.row_values(row)
+            if(values == []):
+                break
+            rows.append(values)
+            row += 1
+        return rows
@@ -0,0 +1,129 @@
+# NAME: sheet_writer.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Collects every write the scraper makes to the google sheet (log rows, result rows, cell updates,
+#              data validation and column resizing) and sends them together as one batchUpdate request when flushed,
+#              instead of one API request per write. If the sheets quota is exceeded the batch is retried with an
+#              increasing wait, so a long run doesn't lose its results on the very last request.
+#
+
+import contextlib
+import time
+
+from gspread.exceptions import APIError # pip3 install gspread
+
+from sheet_access import SHEETS_API
+
+
+# cell of an updateCells/appendCells request, stored as plain text like gspread's append_row does
+def _cell(value):
+    if value is None:
+        return {}
+    return {'userEnteredValue': {'stringValue': str(value)}}
+
+
+def _rows(rows):
+    return [{'values': [_cell(value) for value in row]} for row in rows]
+
+
+# true if the api error means the quota was exceeded (or google is overloaded) and trying again later can work
+def _retryable(error):
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return status in (429, 500, 503) or 'RESOURCE_EXHAUSTED' in str(error) or 'Quota exceeded' in str(error)
+
+
+class SheetWriteBuffer:
+
+    # spreadsheet - gspread Spreadsheet every buffered write goes to
+    # quota - DomainRateLimiter the flush waits on, None for no limit
+    # retries - times a batch is sent again after a quota error before giving up
+    # retry_delay - seconds waited before the first retry, doubles every retry
+    # metrics - RunMetrics every flush is timed in (as sheet_write), None to not time them
+    def __init__(self, spreadsheet, quota = None, retries = 5, retry_delay = 10, metrics = None):
+        self.spreadsheet = spreadsheet
+        self.quota = quota
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.metrics = metrics
+
+        self._requests = []
+        self._resizes = set() # (sheet id, start, end) already in _requests
+        self._row_counts = {} # sheet id -> rows the sheet will have once _requests are sent
+        self.flushes = 0
+
+    def __len__(self):
+        return len(self._requests)
+
+    # like worksheet.append_rows, the rows go after the last row with data
+    def append_rows(self, worksheet, rows):
+        if len(rows) == 0:
+            return
+        self._requests.append({'appendCells': {'sheetId': worksheet.id, 'rows': _rows(rows), 'fields': 'userEnteredValue'}})
+
+    # like worksheet.append_row
+    def append_row(self, worksheet, row):
+        self.append_rows(worksheet, [row])
+
+    # writes rows starting at start_row (1 based), adding rows to the sheet first if it is too short
+    def write_rows(self, worksheet, start_row, rows):
+        if len(rows) == 0:
+            return
+        row_count = self._row_counts.get(worksheet.id, worksheet.row_count)
+        needed = start_row - 1 + len(rows)
+        if needed > row_count:
+            self._requests.append({'appendDimension': {'sheetId': worksheet.id, 'dimension': 'ROWS', 'length': needed - row_count}})
+            row_count = needed
+        self._row_counts[worksheet.id] = row_count
+
+        self._requests.append({'updateCells': {'start': {'sheetId': worksheet.id, 'rowIndex': start_row - 1, 'columnIndex': 0},
+                                               'rows': _rows(rows), 'fields': 'userEnteredValue'}})
+
+    # like worksheet.update_cell (1 based)
+    def update_cell(self, worksheet, row, col, value):
+        self._requests.append({'updateCells': {'start': {'sheetId': worksheet.id, 'rowIndex': row - 1, 'columnIndex': col - 1},
+                                               'rows': _rows([[value]]), 'fields': 'userEnteredValue'}})
+
+    # like worksheet.columns_auto_resize(start, end), the same resize is only sent once per flush
+    def auto_resize(self, worksheet, start, end):
+        if (worksheet.id, start, end) in self._resizes:
+            return
+        self._resizes.add((worksheet.id, start, end))
+        self._requests.append({'autoResizeDimensions': {'dimensions': {'sheetId': worksheet.id, 'dimension': 'COLUMNS',
+                                                                       'startIndex': start, 'endIndex': end}}})
+
+    # dropdown of values on the cells of column col (1 based) from start_row to end_row (1 based, inclusive)
+    def add_validation(self, worksheet, start_row, end_row, col, values):
+        self._requests.append({'setDataValidation': {
+            'range': {'sheetId': worksheet.id, 'startRowIndex': start_row - 1, 'endRowIndex': end_row,
+                      'startColumnIndex': col - 1, 'endColumnIndex': col},
+            'rule': {'condition': {'type': 'ONE_OF_LIST', 'values': [{'userEnteredValue': value} for value in values]},
+                     'strict': False, 'showCustomUi': True}}})
+
+    # sends everything buffered as one batchUpdate, retrying on quota errors
+    def flush(self):
+        if len(self._requests) == 0:
+            return
+
+        delay = self.retry_delay
+        with self.metrics.time('sheet_write') if self.metrics is not None else contextlib.nullcontext():
+            for attempt in range(self.retries + 1):
+                if self.quota is not None:
+                    self.quota.acquire(SHEETS_API)
+                try:
+                    self.spreadsheet.batch_update({'requests': self._requests})
+                    break
+                except APIError as e:
+                    if attempt == self.retries or not _retryable(e):
+                        raise
+                    print("\n--------Sheets quota exceeded, trying again in " + str(delay) + " seconds...............................")
+                    time.sleep(delay)
+                    delay *= 2
+
+        self._requests = []
+        self._resizes = set()
+        self._row_counts = {}
+        self.flushes += 1
@@ -0,0 +1,67 @@
+# NAME: source_cache.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Remembers the OpenAI classification of every news source by the domain it registered, since whether a
+#              source is local, national or international and what it is called doesn't change from article to article.
+#              Entries are kept in the sqlite cache and expire after a time to live so sources are looked at again now
+#              and then. Sources can also be set by hand in source_overrides.txt, one per line:
+#
+#                  wtop.com = Local | WTOP News
+#
+#              an override always wins over what OpenAI said and never expires.
+#
+
+import os
+
+from cache_store import SqliteCache
+from url_utils import registered_domain
+
+OVERRIDES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'source_overrides.txt')
+
+
+# {domain: [reach, name]} from an overrides file, an empty dict if there is no file
+def load_overrides(path = OVERRIDES_FILE):
+    overrides = {}
+    if not os.path.exists(path):
+        return overrides
+
+    with open(path, 'r', encoding = 'utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line == '' or line.startswith('#') or ' = ' not in line:
+                continue
+            domain, value = line.split(' = ', 1)
+            reach, name = (value.split('|', 1) + [''])[:2]
+            overrides[registered_domain(domain.strip())] = [reach.strip().capitalize(), name.strip()]
+    return overrides
+
+
+class SourceCache:
+
+    # path - sqlite file the sources are stored in
+    # ttl_days - days a classification stays valid, None to keep it forever
+    # overrides - {domain: [reach, name]} set by hand, see load_overrides
+    def __init__(self, path, ttl_days = 90, overrides = None):
+        self.cache = SqliteCache('news_sources', path = path, ttl = ttl_days * 86400 if ttl_days is not None else None)
+        self.overrides = overrides or {}
+        self.hits = 0
+
+    # [reach, name] of the news source a link belongs to, None if it was never classified
+    def get(self, link):
+        domain = registered_domain(link)
+        source = self.overrides.get(domain) or self.cache.get(domain)
+        if source is not None:
+            self.hits += 1
+        return source
+
+    def set(self, link, reach, name):
+        domain = registered_domain(link)
+        if domain != '' and domain not in self.overrides:
+            self.cache.set(domain, [reach, name])
+
+    def __contains__(self, link):
+        domain = registered_domain(link)
+        return domain in self.overrides or domain in self.cache
@@ -0,0 +1,92 @@
+# NAME: term_matcher.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Checks which search terms are in an article's text. All the terms of a person are compiled once into an
+#              Aho-Corasick automaton (a trie of the terms with failure links), so an article is read in a single pass
+#              however many terms, templates and affiliation variants there are. Terms and texts are normalized the
+#              same way first: unicode compatibility forms, curly quotes and dashes made plain, invisible characters
+#              removed, any run of whitespace (non-breaking spaces, line breaks) made one space and the case folded.
+#
+
+import re
+import unicodedata
+
+_SPACE = re.compile(r'\s+')
+
+# characters NFKC leaves alone that publishers use instead of plain quotes, dashes and spaces
+_PLAIN = str.maketrans({
+    '\u2018': "'", '\u2019': "'", '\u201a': "'", '\u201b': "'", '\u2032': "'", # curly single quotes, prime
+    '\u201c': '"', '\u201d': '"', '\u201e': '"', '\u201f': '"', '\u2033': '"', # curly double quotes, double prime
+    '\u2010': '-', '\u2011': '-', '\u2012': '-', '\u2013': '-', '\u2014': '-', '\u2212': '-', # hyphens, dashes, minus
+    '\u00ad': None, '\u200b': None, '\u200c': None, '\u200d': None, '\u2060': None, '\ufeff': None, # soft hyphen, zero width
+    })
+
+
+# a text as the terms are looked for in it
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text).translate(_PLAIN).casefold()
+    return _SPACE.sub(' ', text)
+
+
+# a search term normalized like the texts, without spaces at its ends
+def normalize_term(term):
+    return normalize(term).strip()
+
+
+class TermMatcher:
+
+    # terms - the search terms to look for, in any case or form
+    def __init__(self, terms):
+        self.terms = sorted(set(normalize_term(term) for term in terms))
+
+        # the trie: goto[state] maps a character to the next state, output[state] the terms that end there
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for term in self.terms:
+            if term == '':
+                continue
+            state = 0
+            for char in term:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(term)
+
+        # failure links, breadth first: the longest proper suffix of a state that is also a prefix of some term
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail != 0 and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    # {normalized term: start positions in the normalized text} of every term found in text
+    def find(self, text):
+        found = {}
+        if '' in self.terms:
+            found[''] = [0]
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for position, char in enumerate(normalize(text)):
+            while state != 0 and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for term in output[state]:
+                found.setdefault(term, []).append(position - len(term) + 1)
+        return found
+
+    # the normalized terms found in text
+    def found(self, text):
+        return set(self.find(text))
@@ -0,0 +1,101 @@
+# NAME: test_bing_search.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Tests of bing_search.py: bing throttling the search or its scroll pages fails the search as throttled
+#              instead of falling back to chrome or passing off the first pages as all of its results, and only a page
+#              without bing's news layout is searched again in the browser.
+#
+#              python -m unittest discover Article_Scraper/tests
+#
+
+import os
+import sys
+import unittest
+
+import requests # pip3 install requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bing_search import BingNewsSearch
+from health import is_throttling_error
+
+SEARCH_URL = 'https://www.bing.com/news/search?q=jane+doe&qft=sortbydate%3d"1"&form=PTFTNR'
+
+
+def response(status, text = '', url = SEARCH_URL):
+    page = requests.Response()
+    page.status_code = status
+    page.url = url
+    page._content = text.encode('utf-8')
+    page.encoding = 'utf-8'
+    return page
+
+
+def cards(*ids):
+    return ''.join('<div class="news-card" url="https://www.example.com/' + i + '" data-title="Title ' + i + '"></div>' for i in ids)
+
+
+# a requests session answering every get with the next of its pages
+class ScriptedSession:
+
+    def __init__(self, *pages):
+        self.pages = list(pages)
+        self.headers = {}
+
+    def get(self, url, **kwargs):
+        return self.pages.pop(0)
+
+
+class BingSearchTest(unittest.TestCase):
+
+    def bing(self, *pages):
+        self.browser_searches = 0
+        bing = BingNewsSearch(max_results = 100)
+        bing.session = ScriptedSession(*pages)
+
+        # chrome finds one card
+        def search_browser(url):
+            self.browser_searches += 1
+            return [('https://www.example.com/c', 'C')], False
+        bing._search_browser = search_browser
+        return bing
+
+    def test_cards_of_every_scroll_page_are_collected(self):
+        bing = self.bing(response(200, '<script>_G={IG:"0F1E"};</script>' + cards('a', 'b')), response(200, cards('c')), response(200, cards('c')))
+        self.assertEqual(bing.search(SEARCH_URL), ([('https://www.example.com/a', 'Title a'), ('https://www.example.com/b', 'Title b'),
+                                                   ('https://www.example.com/c', 'Title c')], False))
+        self.assertEqual(self.browser_searches, 0)
+
+    def test_throttled_search_is_raised_without_chrome(self):
+        for status in (429, 503):
+            bing = self.bing(response(status, 'Too Many Requests'))
+            with self.assertRaises(requests.HTTPError) as raised:
+                bing.search(SEARCH_URL)
+            self.assertTrue(is_throttling_error(raised.exception))
+            self.assertEqual(self.browser_searches, 0)
+
+    def test_throttled_scroll_page_fails_the_search(self):
+        bing = self.bing(response(200, cards('a', 'b')), response(503, 'Service Unavailable'))
+        with self.assertRaises(requests.HTTPError) as raised:
+            bing.search(SEARCH_URL)
+        self.assertTrue(is_throttling_error(raised.exception))
+
+    def test_captcha_is_reported_as_blocked(self):
+        bing = self.bing(response(200, '<title>Captcha</title>'))
+        self.assertEqual(bing.search(SEARCH_URL), ([], True))
+
+    def test_only_an_unknown_layout_opens_chrome(self):
+        bing = self.bing(response(200, '<html><body>something new</body></html>'))
+        self.assertEqual(bing.search(SEARCH_URL), ([('https://www.example.com/c', 'C')], False))
+        self.assertEqual(self.browser_searches, 1)
+
+        bing = self.bing(response(200, '<div class="b_no">There are no results</div>'))
+        self.assertEqual(bing.search(SEARCH_URL), ([], False))
+        self.assertEqual(self.browser_searches, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+# NAME: test_llm_classifier.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Tests of llm_classifier.py against the stub chat completions endpoint of replay_bench.py's fixture server:
+#              the strict schema request and parsing, refused and invalid answers leaving an article unclassified, known
+#              news sources only asking for the EPA region and the requests and tokens per minute limits.
+#
+#              python -m unittest discover Article_Scraper/tests
+#
+
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI # pip3 install openai
+
+from llm_classifier import FIELDS, ArticleClassifier, ClassificationError, parse_classification
+from replay_bench import OPENAI_PATH, Corpus, FixtureServer
+from source_cache import SourceCache
+
+
+def empty_corpus():
+    return Corpus([], [], [], '', {}, {}, {})
+
+
+class ClassifierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FixtureServer(empty_corpus())
+        self.server.start()
+        self.client = OpenAI(api_key = 'test', base_url = self.server.base + OPENAI_PATH, max_retries = 0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def classifier(self, **settings):
+        settings.setdefault('requests_per_minute', None)
+        settings.setdefault('tokens_per_minute', None)
+        return ArticleClassifier(self.client, **settings)
+
+    def test_strict_schema_answer_is_parsed(self):
+        result = self.classifier().classify('https://www.example.com/news/1')
+
+        self.assertEqual(result, {'reach': 'Local', 'epa_region': '1', 'news_source': 'Fixture News'})
+        response_format = self.server.chat_requests[0]['response_format']
+        self.assertEqual(response_format['type'], 'json_schema')
+        self.assertTrue(response_format['json_schema']['strict'])
+        self.assertEqual(response_format['json_schema']['schema']['required'], list(FIELDS))
+        self.assertFalse(response_format['json_schema']['schema']['additionalProperties'])
+
+    def test_only_the_epa_region_is_asked_for(self):
+        result = self.classifier().classify('https://www.example.com/news/1', ('epa_region',))
+
+        self.assertEqual(result, {'epa_region': '1'})
+        self.assertEqual(list(self.server.chat_requests[0]['response_format']['json_schema']['schema']['properties']), ['epa_region'])
+
+    def test_refusal_leaves_the_article_unclassified(self):
+        self.server.answer = lambda body: {'role': 'assistant', 'content': None, 'refusal': "I can't help with that."}
+        classifier = self.classifier()
+
+        with self.assertRaises(ClassificationError):
+            classifier.classify('https://www.example.com/news/1')
+        self.assertEqual(classifier.classify_many(['https://www.example.com/news/1']), [None])
+        self.assertEqual(classifier.stats['failed'], 1)
+
+    def test_invalid_answers_leave_the_article_unclassified(self):
+        answers = ['not json', '["Local", 1, "Fixture News"]', json.dumps({'reach': 'Galactic', 'epa_region': 1, 'news_source': 'X'}),
+                   json.dumps({'reach': 'Local', 'epa_region': 11, 'news_source': 'X'}), json.dumps({'reach': 'Local', 'epa_region': 1})]
+        classifier = self.classifier()
+        for content in answers:
+            self.server.answer = lambda body, content = content: {'role': 'assistant', 'content': content}
+            with self.assertRaises(ClassificationError, msg = content):
+                classifier.classify('https://www.example.com/news/1')
+
+        self.server.answer = lambda body: {'role': 'assistant', 'content': 'not json'}
+        results = classifier.classify_many(['https://www.example.com/news/1', 'https://www.example.org/news/2'])
+        self.assertEqual(results, [None, None])
+
+    def test_answers_are_written_like_the_sheet_expects(self):
+        parsed = parse_classification(json.dumps({'reach': 'national', 'epa_region': '3', 'news_source': ' Fixture News '}))
+        self.assertEqual(parsed, {'reach': 'National', 'epa_region': '3', 'news_source': 'Fixture News'})
+
+    def test_known_sources_only_ask_for_the_epa_region(self):
+        with tempfile.TemporaryDirectory() as directory:
+            sources = SourceCache(os.path.join(directory, 'cache.db'))
+            links = ['https://www.example.com/news/1', 'https://www.example.com/news/2', 'https://news.example.org/3']
+            results = self.classifier(concurrency = 1).classify_many(links, sources = sources)
+            sources.cache.close()
+
+        self.assertEqual(results, [['Local', '1', 'Fixture News']] * 3)
+        asked = sorted(tuple(body['response_format']['json_schema']['schema']['properties']) for body in self.server.chat_requests)
+        self.assertEqual(asked, [('epa_region',), FIELDS, FIELDS])
+
+    def test_requests_per_minute_are_respected(self):
+        # 600 a minute is 10 a second with a burst of 10, the 5 after the burst wait 0.1 s each
+        classifier = self.classifier(requests_per_minute = 600)
+        start = time.monotonic()
+        results = classifier.classify_many(['https://site' + str(i) + '.example.com/a' for i in range(15)])
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+        self.assertEqual(len(self.server.chat_requests), 15)
+        self.assertNotIn(None, results)
+
+    def test_tokens_per_minute_are_respected(self):
+        classifier = self.classifier()
+        link = 'https://site0.example.com/a'
+        estimate = classifier._estimate(classifier._messages(link, FIELDS))
+
+        # a second's worth of tokens covers two requests, every request after them waits about half a second
+        classifier = self.classifier(tokens_per_minute = estimate * 2 * 60)
+        start = time.monotonic()
+        classifier.classify_many(['https://site' + str(i) + '.example.com/a' for i in range(4)])
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.9)
+        self.assertGreater(classifier.stats['tokens'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+# NAME: test_openai_batch.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Tests of openai_batch.py against the stub files and batches endpoints of replay_bench.py's fixture server:
+#              submitting the rows that need a classification, waiting for the batch, merging its results back into the
+#              rows and leaving the rows whose requests failed or expired unclassified.
+#
+#              python -m unittest discover Article_Scraper/tests
+#
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI # pip3 install openai
+
+import openai_batch
+from replay_bench import OPENAI_PATH, Corpus, FixtureServer
+from source_cache import SourceCache
+
+
+# a row of data like the scraper builds them, unclassified
+def row(link, title = 'Jane Doe talks water plan'):
+    return [link + ' ', title, 'Google', '"Jane Doe" "EPA"', '2024-05-01', '2024-05-02', '', '', '', '']
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FixtureServer(Corpus([], [], [], '', {}, {}, {}))
+        self.server.start()
+        self.client = OpenAI(api_key = 'test', base_url = self.server.base + OPENAI_PATH, max_retries = 0)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.files = {'requests_file': os.path.join(self.directory.name, 'batch_requests.jsonl'),
+                      'job_file': os.path.join(self.directory.name, 'batch_job.json')}
+
+        self.data = [row('https://www.example.com/news/1'),
+                     row('https://www.example.com/news/2', "ARTICLE TIMED OUT WHEN FETCHING DATA"),
+                     row('https://www.example.org/news/3'),
+                     row('https://www.example.net/news/4')]
+        self.data[3][7:10] = ['National', '4', 'Example Net']
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def submit(self, sources = None, query_marks = None):
+        return openai_batch.submit(self.client, self.data, '2024-01-01', 'gpt-4o-mini', sources = sources, query_marks = query_marks, **self.files)
+
+    def wait(self, record, timeout = None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return openai_batch.wait(self.client, record, poll_interval = 0.01, timeout = timeout)
+
+    def test_submit_wait_merge(self):
+        self.server.batch_polls = 2
+        record = self.submit()
+
+        # only the rows that weren't classified and didn't time out are asked about
+        self.assertEqual(sorted(record['jobs']), ['row-0', 'row-2'])
+        self.assertEqual(openai_batch.load_job(self.files['job_file'])['batch_id'], record['batch_id'])
+        with open(self.files['requests_file'], encoding = 'utf-8') as file:
+            lines = [json.loads(line) for line in file]
+        self.assertEqual([line['custom_id'] for line in lines], ['row-0', 'row-2'])
+        self.assertTrue(all(line['body']['response_format']['json_schema']['strict'] for line in lines))
+
+        batch = self.wait(record)
+        self.assertEqual(batch.status, 'completed')
+        self.assertEqual(self.server.batches[batch.id]['polls'], 3)
+
+        self.assertEqual(openai_batch.merge(self.client, batch, record), 2)
+        self.assertEqual(self.data[0][7:10], ['Local', '1', 'Fixture News'])
+        self.assertEqual(self.data[1][7:10], ['', '', ''])
+        self.assertEqual(self.data[2][7:10], ['Local', '1', 'Fixture News'])
+        self.assertEqual(self.data[3][7:10], ['National', '4', 'Example Net'])
+
+        openai_batch.finish(**self.files)
+        self.assertIsNone(openai_batch.load_job(self.files['job_file']))
+        self.assertFalse(os.path.exists(self.files['requests_file']))
+
+    def test_failed_and_expired_rows_are_left_unclassified(self):
+        self.server.batch_polls = 0
+        self.server.batch_status = 'expired'
+
+        def result(request):
+            if request['custom_id'] == 'row-0':
+                return {'id': 'batch_req_0', 'custom_id': 'row-0', 'response': None,
+                        'error': {'code': 'batch_expired', 'message': 'This request could not be executed before the completion window expired.'}}
+            if request['custom_id'] == 'row-2':
+                return {'id': 'batch_req_2', 'custom_id': 'row-2', 'error': None,
+                        'response': {'status_code': 500, 'body': {'error': {'message': 'The server had an error.'}}}}
+            return {'id': 'batch_req_3', 'custom_id': request['custom_id'], 'error': None,
+                    'response': {'status_code': 200, 'body': self.server.chat_completion(request['body'])}}
+        self.server.batch_result = result
+
+        self.data.append(row('https://www.example.edu/news/5'))
+        record = self.submit()
+        batch = self.wait(record)
+        self.assertEqual(batch.status, 'expired')
+        self.assertIsNotNone(batch.error_file_id)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(openai_batch.merge(self.client, batch, record), 1)
+        self.assertEqual(self.data[0][7:10], ['', '', ''])
+        self.assertEqual(self.data[2][7:10], ['', '', ''])
+        self.assertEqual(self.data[4][7:10], ['Local', '1', 'Fixture News'])
+
+    def test_invalid_and_refused_answers_are_left_unclassified(self):
+        self.server.batch_polls = 0
+        self.server.answer = lambda body: {'role': 'assistant', 'content': None, 'refusal': "I can't help with that."}
+        record = self.submit()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(openai_batch.merge(self.client, self.wait(record), record), 0)
+        self.assertEqual(self.data[0][7:10], ['', '', ''])
+
+    def test_wait_gives_up_after_the_timeout(self):
+        self.server.batch_polls = 1000
+
+        record = self.submit(query_marks = {'"Jane Doe" "EPA"': (['Google News'], '2024-05-01')})
+        batch = self.wait(record, timeout = 0.05)
+        self.assertNotIn(batch.status, openai_batch.FINISHED)
+        self.assertEqual(openai_batch.merge(self.client, batch, record), 0)
+
+        # a later --resume-batch finds the job and picks up the results once the batch is done
+        self.server.batch_polls = 0
+        self.server.batches[record['batch_id']]['polls'] = 0
+        record = openai_batch.load_job(self.files['job_file'])
+        self.assertEqual(record['query_marks'], {'"Jane Doe" "EPA"': [['Google News'], '2024-05-01']})
+        self.assertEqual(openai_batch.merge(self.client, self.wait(record), record), 2)
+        self.assertEqual(record['data'][0][7:10], ['Local', '1', 'Fixture News'])
+
+    def test_known_sources_only_ask_for_the_epa_region(self):
+        self.server.batch_polls = 0
+        sources = SourceCache(os.path.join(self.directory.name, 'cache.db'))
+        sources.set('https://www.example.org/', 'International', 'Example Org')
+        record = self.submit(sources)
+
+        self.assertEqual(record['jobs'], {'row-0': ['reach', 'epa_region', 'news_source'], 'row-2': ['epa_region']})
+        self.assertEqual(openai_batch.merge(self.client, self.wait(record), record, sources = sources), 2)
+        self.assertEqual(self.data[2][7:10], ['International', '1', 'Example Org'])
+        self.assertEqual(sources.get('https://www.example.com/other'), ['Local', 'Fixture News'])
+        sources.cache.close()
+
+    def test_nothing_to_classify_submits_no_batch(self):
+        for line in self.data:
+            line[7:10] = ['Local', '1', 'Fixture News']
+        record = self.submit()
+
+        self.assertIsNone(record['batch_id'])
+        self.assertEqual(self.server.batches, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# NAME: test_replay_record.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Tests of replay_bench.py's recorder: what a live run found is written in the layout Corpus.load reads,
+#              google links and bing cards of the same publisher link share one article id and links whose page
+#              couldn't be downloaded keep their id without a page.
+#
+#              python -m unittest discover Article_Scraper/tests
+#
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replay_bench import Corpus, Recorder
+
+GOOGLE_LINK = 'https://news.google.com/rss/articles/CBMiX2h0dHBz?oc=5'
+FAILED_LINK = 'https://news.google.com/rss/articles/CBMiX2h0dHBa?oc=5'
+
+
+class RecorderTest(unittest.TestCase):
+
+    def test_recording_is_saved_like_a_corpus(self):
+        recorder = Recorder()
+        recorder.google['epa|jane doe'] = [(GOOGLE_LINK, 'Jane Doe talks water plan', 'Wed, 01 May 2024 07:00:00 GMT'),
+                                           (FAILED_LINK, 'Jane Doe reviews air plan', 'Thu, 02 May 2024 07:00:00 GMT')]
+        recorder.resolved[GOOGLE_LINK] = 'https://www.example.com/news/1'
+        recorder.bing['epa|jane doe'] = [('https://www.example.org/news/2', 'Jane Doe questions soil plan'),
+                                         ('https://www.example.com/news/1', 'Jane Doe talks water plan')]
+        recorder.pages['https://www.example.com/news/1'] = '<html>1</html>'
+        recorder.pages['https://www.example.org/news/2'] = '<html>2</html>'
+
+        corpus = recorder.corpus([['Jane', 'Doe', 'EPA']], ['"First Name Last Name" "Affiliation"'],
+                                 ['EPA = Environmental Protection Agency'], '1 year')
+        with tempfile.TemporaryDirectory() as directory:
+            corpus.save(directory)
+            loaded = Corpus.load(directory)
+
+        google = loaded.google['epa|jane doe']
+        bing = loaded.bing['epa|jane doe']
+        self.assertEqual([article['published date'] for article in google], ['Wed, 01 May 2024 07:00:00 GMT', 'Thu, 02 May 2024 07:00:00 GMT'])
+        self.assertEqual(bing[1], [google[0]['id'], 'Jane Doe talks water plan'])
+        self.assertEqual(loaded.pages, {google[0]['id']: '<html>1</html>', bing[0][0]: '<html>2</html>'})
+        self.assertNotIn(google[1]['id'], loaded.pages)
+        self.assertEqual((loaded.people, loaded.date_range), ([['Jane', 'Doe', 'EPA']], '1 year'))
+
+
+if __name__ == '__main__':
+    unittest.main()
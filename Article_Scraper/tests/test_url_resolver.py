@@ -0,0 +1,116 @@
+# NAME: test_url_resolver.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Tests of url_resolver.py: google links that can't be resolved (chrome failing included) come back
+#              unresolved and aren't cached, google.com pages are never taken for the publisher's link and resolving a
+#              link that google redirects doesn't download the publisher's page.
+#
+#              python -m unittest discover Article_Scraper/tests
+#
+
+import contextlib
+import os
+import sys
+import tempfile
+import unittest
+
+import requests # pip3 install requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_store import SqliteCache
+from url_resolver import GoogleNewsResolver, is_google_news
+
+GOOGLE_LINK = 'https://news.google.com/rss/articles/CBMiX2h0dHBz?oc=5'
+
+
+# a requests session that answers with google's redirects and remembers every url it was asked for
+class RedirectingSession:
+
+    def __init__(self, redirects):
+        self.redirects = redirects
+        self.requested = []
+        self.headers = {}
+
+    def get(self, url, allow_redirects = True, **kwargs):
+        self.requested.append(url)
+        page = requests.Response()
+        page.url = url
+        page.status_code = 302 if url in self.redirects else 200
+        if url in self.redirects:
+            page.headers['Location'] = self.redirects[url]
+        page._content = b'<html><body>publisher page</body></html>'
+        return page
+
+
+# remembers the hosts and statuses recorded against the health tracker
+class RecordingHealth:
+
+    def __init__(self):
+        self.responses = []
+
+    def allow(self, host):
+        return True
+
+    def record_response(self, host, status, final_url, retry_after = None):
+        self.responses.append((host, status, final_url))
+
+
+# a DriverPool whose chrome never starts
+class BrokenDriverPool:
+
+    @contextlib.contextmanager
+    def driver(self):
+        raise RuntimeError("chrome failed to start")
+        yield
+
+
+class ResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = SqliteCache('resolved_urls', path = os.path.join(self.directory.name, 'cache.db'))
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def test_google_hosts_are_not_resolved(self):
+        self.assertTrue(is_google_news(GOOGLE_LINK))
+        self.assertTrue(is_google_news('https://consent.google.com/ml?continue=https://news.google.com/'))
+        self.assertFalse(is_google_news('https://www.example.com/news/1'))
+        self.assertFalse(is_google_news('https://google.com.example.org/news/1'))
+
+    def test_chrome_failing_leaves_the_link_unresolved(self):
+        resolver = GoogleNewsResolver(self.cache, driver_pool = BrokenDriverPool(), timeout = 1)
+        resolver._resolve_http = lambda url: None # google didn't redirect and batchexecute didn't answer
+
+        self.assertEqual(resolver.resolve(GOOGLE_LINK), GOOGLE_LINK)
+        self.assertEqual(resolver.stats['failed'], 1)
+        self.assertIsNone(self.cache.get(GOOGLE_LINK))
+
+    def test_a_cached_google_page_is_resolved_again(self):
+        self.cache.set(GOOGLE_LINK, 'https://consent.google.com/ml')
+        resolver = GoogleNewsResolver(self.cache, timeout = 1)
+        resolver._resolve_http = lambda url: 'https://www.example.com/news/1'
+
+        self.assertEqual(resolver.resolve(GOOGLE_LINK), 'https://www.example.com/news/1')
+        self.assertEqual(self.cache.get(GOOGLE_LINK), 'https://www.example.com/news/1')
+
+    def test_the_redirect_is_read_without_downloading_the_publisher(self):
+        health = RecordingHealth()
+        resolver = GoogleNewsResolver(self.cache, timeout = 1, health = health)
+        resolver.session = RedirectingSession({'https://news.google.com/rss/articles/CBMiX2h0dHBz': '/articles/CBMiX2h0dHBz',
+                                               'https://news.google.com/articles/CBMiX2h0dHBz': 'https://www.example.com/news/1'})
+
+        self.assertEqual(resolver.resolve(GOOGLE_LINK), 'https://www.example.com/news/1')
+        self.assertNotIn('https://www.example.com/news/1', resolver.session.requested)
+        self.assertEqual([response[1] for response in health.responses], [302, 302])
+        self.assertEqual(resolver.stats['http'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# NAME: test_watermarks.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Tests of watermarks.py: where an incremental search of a query starts and that an incremental google
+#              search only keeps the articles published since then, even though gnews drops the date range of a search
+#              for more than 100 results.
+#
+#              python -m unittest discover Article_Scraper/tests
+#
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replay_bench import Corpus, fake_gnews
+from watermarks import QueryWatermarks, published_day, published_since
+
+QUERY = '"Jane Doe" "EPA"'
+
+
+class WatermarkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.watermarks = QueryWatermarks(os.path.join(self.directory.name, 'cache.db'))
+
+    def tearDown(self):
+        self.watermarks.cache.close()
+        self.directory.cleanup()
+
+    def test_since_starts_a_little_before_the_last_search(self):
+        start = date(2024, 1, 1)
+        self.assertEqual(self.watermarks.since(QUERY, 'Google News', start), start)
+
+        self.watermarks.update(QUERY, ['Google News'], date(2024, 5, 10), '2024-05-09')
+        self.assertEqual(self.watermarks.since(QUERY, 'Google News', start, 2), date(2024, 5, 8))
+        self.assertEqual(self.watermarks.since(QUERY, 'Google News', date(2024, 5, 9), 2), date(2024, 5, 9))
+        self.assertEqual(self.watermarks.since(QUERY, 'Bing News', start), start)
+        self.assertEqual(self.watermarks.get(QUERY)['newest'], '2024-05-09')
+
+    def test_publish_dates_of_gnews_and_of_the_sheet_are_read(self):
+        self.assertEqual(published_day('Wed, 01 May 2024 07:00:00 GMT'), '2024-05-01')
+        self.assertEqual(published_day('2024-05-01 00:00:00'), '2024-05-01')
+        self.assertIsNone(published_day(''))
+        self.assertIsNone(published_day('yesterday'))
+
+    def test_incremental_google_search_only_keeps_new_articles(self):
+        published = ['Mon, 06 May 2024 07:00:00 GMT', 'Thu, 09 May 2024 07:00:00 GMT', '2024-04-02', '2024-05-08', '']
+        articles = [{'id': 'a' + str(i), 'title': 'Jane Doe talks water plan', 'published date': day} for i, day in enumerate(published)]
+        gnews = fake_gnews(Corpus([], [], [], '', {'epa|jane doe': articles}, {}, {}))
+
+        # like the scraper's, a search for more than 100 results whose date range gnews drops
+        search = gnews.GNews(max_results = 1000, start_date = (2024, 1, 1), end_date = (2024, 5, 10))
+        found = search.get_news(QUERY)
+        self.assertIsNone(search.start_date)
+        self.assertEqual(len(found), 5)
+
+        self.watermarks.update(QUERY, ['Google News'], date(2024, 5, 10))
+        since = self.watermarks.since(QUERY, 'Google News', date(2024, 1, 1), 2)
+        kept = [article['url'].split('/')[-1].split('?')[0] for article in published_since(found, since)]
+        self.assertEqual(kept, ['a1', 'a3', 'a4'])
+        self.assertEqual(len(published_since(found, None)), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# NAME: text_sketch.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Low memory stand-in for the text of a downloaded article. The scraper only keeps an article's text to
+#              compare it with the person's other articles and to check that the search terms are in it, so in low
+#              memory mode the text is replaced right after it is parsed by a sketch holding its minhash signature, the
+#              search terms of the person that were found in it and a short snippet. The full text is let go of at
+#              once, so memory doesn't grow with the size of the pages or max_results.
+#
+
+
+class TextSketch:
+
+    __slots__ = ('signature', 'terms', 'snippet')
+
+    # signature - minhash signature of the text, from NearDuplicateIndex.signature
+    # terms - normalized search terms that are in the text
+    def __init__(self, signature, terms, snippet = ''):
+        self.signature = tuple(signature)
+        self.terms = frozenset(terms)
+        self.snippet = snippet
+
+    # builds the sketch of a text. matcher - TermMatcher of every search term that may be checked later,
+    # signer - NearDuplicateIndex
+    @classmethod
+    def of(cls, text, matcher, signer, snippet_length = 300):
+        return cls(signer.signature(text), matcher.found(text), text[:snippet_length])
+
+    # plain values, for the run journal
+    def as_dict(self):
+        return {'signature': list(self.signature), 'terms': sorted(self.terms), 'snippet': self.snippet}
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(values['signature'], values['terms'], values.get('snippet', ''))
+
+    def __str__(self):
+        return self.snippet
+
+
+# the normalized search terms of matcher that are in an article's text, or that were found in it when its sketch was made
+def found_terms(text, matcher):
+    if isinstance(text, TextSketch):
+        return text.terms
+    return matcher.found(text)
+
+
+# a journaled text back as it was: sketches are stored as dicts, full texts as strings
+def text_from_journal(value):
+    if isinstance(value, dict) and 'signature' in value:
+        return TextSketch.from_dict(value)
+    return value
+
+
+# a text as the journal stores it
+def text_for_journal(text):
+    if isinstance(text, TextSketch):
+        return text.as_dict()
+    return text
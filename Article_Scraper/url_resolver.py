@@ -0,0 +1,163 @@
+# NAME: url_resolver.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Turns the news.google.com links that GNews returns into the publisher's actual url without opening a browser.
+#              The google article page is requested over plain http, if it redirects to the publisher the redirect's
+#              location is the real url (the publisher's page isn't downloaded here, the fetcher does that once). If it
+#              doesn't the signature and timestamp on the page are sent to google's batchexecute endpoint which answers
+#              with the real url.
+#              Only if both of those fail is the link opened in a pooled chrome driver. Every resolved link is saved in a
+#              persistent cache keyed by the google url, so articles that come back run after run are a local lookup.
+#
+
+import json
+from urllib.parse import quote, urljoin, urlparse
+
+import requests # pip3 install requests
+from bs4 import BeautifulSoup # pip3 install beautifulsoup4
+from selenium.webdriver.support.ui import WebDriverWait # pip3 install selenium
+
+GOOGLE_NEWS_HOST = 'news.google.com'
+GOOGLE_HOST = 'google.com'
+GOOGLE_NEWS_ARTICLE_URL = 'https://news.google.com/rss/articles/'
+BATCHEXECUTE_URL = 'https://news.google.com/_/DotsSplashUi/data/batchexecute'
+MAX_REDIRECTS = 10
+
+
+# true if the url still points at google news (not resolved yet). any google.com host counts, a link that ended up on
+# consent.google.com or accounts.google.com isn't the publisher's either
+def is_google_news(url):
+    host = (urlparse(url).hostname or '').lower()
+    return host == GOOGLE_HOST or host.endswith('.' + GOOGLE_HOST)
+
+
+# pulls the article id out of links like news.google.com/rss/articles/<id>?oc=5 or news.google.com/read/<id>
+def google_article_id(url):
+    parts = urlparse(url).path.rstrip('/').split('/')
+    if len(parts) >= 2 and parts[-2] in ('articles', 'read'):
+        return parts[-1]
+    return None
+
+
+class GoogleNewsResolver:
+
+    # cache - SqliteCache that stores google url -> publisher url
+    # driver_pool - DriverPool used as the last resort, None to never open a browser
+    # rate_limiter - DomainRateLimiter to wait on before every request to google, None for no limit
+    # health - HealthTracker for news.google.com, the http attempt is skipped while its breaker is open
+    def __init__(self, cache, driver_pool = None, user_agent = None, timeout = 10, rate_limiter = None, health = None):
+        self.cache = cache
+        self.driver_pool = driver_pool
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.health = health
+
+        self.session = requests.Session()
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+
+        self.stats = {'cache': 0, 'http': 0, 'browser': 0, 'failed': 0}
+
+    # returns the publisher url for a google news link
+    def resolve(self, url):
+        cached = self.cache.get(url)
+        if cached is not None and not is_google_news(cached): # older runs could have cached a google consent page
+            self.stats['cache'] += 1
+            return cached
+
+        actual_url = None
+        if self.health is None or self.health.allow(GOOGLE_NEWS_HOST):
+            try:
+                actual_url = self._resolve_http(url)
+            except Exception:
+                if self.health is not None:
+                    self.health.record_failure(GOOGLE_NEWS_HOST)
+                # fall through to the browser
+
+        if actual_url is not None and not is_google_news(actual_url):
+            self.stats['http'] += 1
+        else:
+            try:
+                actual_url = self._resolve_browser(url)
+            except Exception:
+                actual_url = url # chrome didn't start or the page didn't load, the link is handled like one that timed out
+            if is_google_news(actual_url):
+                self.stats['failed'] += 1
+                return actual_url # don't cache a link we couldn't resolve, try again next run
+            self.stats['browser'] += 1
+
+        self.cache.set(url, actual_url)
+        return actual_url
+
+    # plain http: follow google's redirects up to the first one that leaves google, if google doesn't redirect ask
+    # batchexecute to decode the article id
+    def _resolve_http(self, url):
+        article_id = google_article_id(url)
+
+        page_url = url if article_id is None else GOOGLE_NEWS_ARTICLE_URL + article_id
+        for hop in range(MAX_REDIRECTS):
+            self._wait(page_url)
+            page = self.session.get(page_url, timeout = self.timeout, allow_redirects = False)
+            self._record(page)
+            if not page.is_redirect:
+                break
+            page_url = urljoin(page_url, page.headers['Location'])
+            # the publisher's link, its page is only downloaded by the fetcher
+            if not is_google_news(page_url):
+                return page_url
+        else:
+            return None
+        if article_id is None:
+            return None
+
+        # the article page carries a signature and timestamp that batchexecute needs to decode the id
+        soup = BeautifulSoup(page.text, features = "html.parser")
+        div = soup.select_one('c-wiz > div[jscontroller]')
+        if div is None or not div.get('data-n-a-sg') or not div.get('data-n-a-ts'):
+            return None
+        signature = div.get('data-n-a-sg')
+        timestamp = div.get('data-n-a-ts')
+
+        request = ["Fbv4je",
+                   '["garturlreq",[["X","X",["X","X"],null,null,1,1,"US:en",null,1,null,null,null,null,null,0,1],"X","X",1,[1,1,1],1,1,null,0,0,null,0],"'
+                   + article_id + '",' + timestamp + ',"' + signature + '"]']
+        self._wait(BATCHEXECUTE_URL)
+        response = self.session.post(BATCHEXECUTE_URL,
+                                     headers = {"Content-Type": "application/x-www-form-urlencoded;charset=UTF-8"},
+                                     data = "f.req=" + quote(json.dumps([[request]])),
+                                     timeout = self.timeout)
+        self._record(response)
+        response.raise_for_status()
+
+        # response is ")]}'" followed by a json array, the decoded url is inside a json string inside that array
+        parsed = json.loads(response.text.split("\n\n")[1])[:-2]
+        return json.loads(parsed[0][2])[1]
+
+    # wait for the rate limit of the host url is on
+    def _wait(self, url):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(url)
+
+    # tell the health tracker how google answered
+    def _record(self, response):
+        if self.health is not None:
+            retry_after = response.headers.get('Retry-After')
+            self.health.record_response(GOOGLE_NEWS_HOST, response.status_code, response.url,
+                                        float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+    # last resort, open the link in chrome and wait for google's javascript redirect
+    def _resolve_browser(self, url):
+        if self.driver_pool is None:
+            return url
+
+        with self.driver_pool.driver() as driver:
+            self._wait(url)
+            driver.get(url)
+            try:
+                WebDriverWait(driver, 5).until(lambda d: not is_google_news(d.current_url))
+            except Exception:
+                pass # timed out still on google, return whatever the browser is on
+            return driver.current_url
@@ -0,0 +1,86 @@
+# NAME: url_utils.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: Small helpers for working with the links the scraper finds.
+#
+
+from urllib.parse import urlparse
+
+
+# host of a url without "www." or a port, lowercased. accepts a bare host too ("www.bing.com" -> "bing.com")
+def domain_of(url):
+    if '//' not in url:
+        url = '//' + url
+    host = urlparse(url.strip()).hostname or ''
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+
+# query parameters that only track where a click came from, they never change which article a link points to
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'ocid', 'cmpid', 'cmp', 'smid', 'smtyp', 'mc_cid', 'mc_eid', 'igshid',
+    'ref', 'ref_src', 'ref_url', 'referrer', 'icid', 'mbid', 'sr_share', 'partner', 'amp', 'outputtype',
+    '_ga', '_gl', 'guccounter', 'guce_referrer', 'guce_referrer_sig', 'taid', 'soc_src', 'soc_trk', 'ncid', 'yptr', 'spot_im_redirect_source',
+    }
+TRACKING_PREFIXES = ('utm_', 'hsa_', 'at_')
+MOBILE_SUBDOMAINS = ('www.', 'm.', 'mobile.', 'amp.')
+
+
+# key that is the same for every variant of an article's link, used to find duplicates before downloading.
+# drops the " " the scraper appends to links, the scheme, "www."/mobile/amp hosts and paths, tracking parameters,
+# fragments and trailing slashes. the result is only a key, it isn't meant to be opened
+def canonicalize_url(url):
+    url = url.strip()
+    if '//' not in url:
+        url = '//' + url
+    parts = urlparse(url)
+
+    host = (parts.hostname or '').lower()
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in MOBILE_SUBDOMAINS:
+            if host.startswith(prefix) and host.count('.') > 1:
+                host = host[len(prefix):]
+                stripped = True
+
+    path = parts.path
+    if path.endswith('.amp.html'):
+        path = path[:-len('.amp.html')] + '.html'
+    segments = [segment for segment in path.split('/') if segment != '']
+    if len(segments) > 0 and segments[-1].lower() == 'amp':
+        segments.pop()
+    if len(segments) > 0 and segments[0].lower() == 'amp':
+        segments.pop(0)
+    path = '/' + '/'.join(segments)
+
+    query = []
+    for pair in parts.query.split('&'):
+        if pair == '':
+            continue
+        name = pair.split('=', 1)[0].lower()
+        if name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES):
+            continue
+        query.append(pair)
+    query.sort()
+
+    return host + path + ('?' + '&'.join(query) if query else '')
+
+
+# second level labels that are part of a country's public suffix ("bbc.co.uk", "abc.net.au")
+PUBLIC_SECOND_LEVELS = {'co', 'com', 'net', 'org', 'gov', 'edu', 'ac', 'or', 'ne', 'go', 'gob', 'nic', 'mil'}
+
+
+# domain a publisher registered, the same for all its subdomains ("news.bbc.co.uk" -> "bbc.co.uk", "edition.cnn.com" -> "cnn.com").
+# a small public suffix heuristic, good enough to group the links of one news source
+def registered_domain(url):
+    labels = domain_of(url).split('.')
+    if len(labels) <= 2:
+        return '.'.join(labels)
+    if len(labels[-1]) == 2 and labels[-2] in PUBLIC_SECOND_LEVELS:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
@@ -0,0 +1,86 @@
+# NAME: watermarks.py
+#
+# Parent program: article_scraper.py
+#
+# Python Version Tested With: 3.12.2 / 3.12.3 / 3.9.18
+#
+# Description: High water marks of every search query, kept in the sqlite cache: the last day each search source
+#              (Google News, Bing News) searched the query successfully and the newest publish date found for it.
+#              In incremental mode a query is only searched from a little before its last successful search instead
+#              of over the whole date range again. Queries that were never searched get the whole date range.
+#
+
+from datetime import date, timedelta
+from email.utils import parsedate_to_datetime
+
+from cache_store import SqliteCache
+from search_cache import normalize_query
+
+
+# the yyyy-mm-dd part of a publish date in any of the forms the scraper stores them, None if it isn't a date
+def date_part(value):
+    value = str(value or '')[:10]
+    try:
+        return str(date.fromisoformat(value))
+    except ValueError:
+        return None
+
+
+# the yyyy-mm-dd day of a google news 'published date' ("Wed, 01 May 2024 07:00:00 GMT"), None if it isn't a date
+def published_day(value):
+    day = date_part(value)
+    if day is not None:
+        return day
+    try:
+        return str(parsedate_to_datetime(value).date())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+# the articles of a google news search published on or after since (all of them if since is None). gnews drops the date
+# range of a search for more than 100 results, so an incremental search can't leave the older articles to google.
+# articles without a readable publish date are kept
+def published_since(articles, since):
+    if since is None:
+        return list(articles)
+    kept = []
+    for article in articles:
+        day = published_day(article.get('published date'))
+        if day is None or day >= str(since):
+            kept.append(article)
+    return kept
+
+
+class QueryWatermarks:
+
+    def __init__(self, path):
+        self.cache = SqliteCache('query_watermarks', path = path)
+
+    def get(self, query):
+        return self.cache.get(normalize_query(query)) or {}
+
+    # day the source last searched the query successfully, None if it never did
+    def last_searched(self, query, source):
+        searched = self.get(query).get(source)
+        return date.fromisoformat(searched) if searched is not None else None
+
+    # first day a search of the query has to cover: overlap_days before the last successful search by the source,
+    # never before start (the configured date range, None for no limit). start if the query was never searched
+    def since(self, query, source, start, overlap_days = 2):
+        searched = self.last_searched(query, source)
+        if searched is None:
+            return start
+        since = searched - timedelta(days = overlap_days)
+        if start is not None and since < start:
+            return start
+        return since
+
+    # records that the sources searched the query on the day searched_on, and the newest publish date found
+    def update(self, query, sources, searched_on, newest = None):
+        mark = self.get(query)
+        for source in sources:
+            mark[source] = str(searched_on)
+        newest = date_part(newest)
+        if newest is not None and (mark.get('newest') is None or newest > mark['newest']):
+            mark['newest'] = newest
+        self.cache.set(normalize_query(query), mark)